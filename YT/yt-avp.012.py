@@ -6,7 +6,7 @@ Codename: liquid
 Beta ASCII Video Player
 """.format(version=".012")
 
-import cv2
+import numpy as np
 import sys
 import os
 import time
@@ -14,6 +14,21 @@ import subprocess
 import urllib.parse
 import shutil
 import argparse
+import json
+import re
+import functools
+import itertools
+import threading
+import queue
+import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory
+import struct
+import zlib
+import mmap
+import glob
+import signal
+import socket
 
 # Versioning and codename
 VERSION = ".012"
@@ -25,81 +40,2291 @@ DEFAULT_ASCII_GRADIENT = "@%#*+=-:./\\|~<>?"
 # Braille gradient from darkest to lightest (16 characters, no blank)
 BRAILLE_ASCII_GRADIENT = "⣿⣷⣯⣟⡿⢿⣻⣽⣾⡾⣷⣯⣟⡿⢿⣻⣽"
 
+# Pre-built 24-bit colour escape fragments, indexed by channel value (0-255), used by the
+# run-coalescing encoder.
+RED_ESCAPE_BYTES = np.array([b'\033[38;2;%d;' % v for v in range(256)], dtype=object)
+GREEN_ESCAPE_BYTES = np.array([b'%d;' % v for v in range(256)], dtype=object)
+BLUE_ESCAPE_BYTES = np.array([b'%dm' % v for v in range(256)], dtype=object)
+BG_RED_ESCAPE_BYTES = np.array([b'\033[48;2;%d;' % v for v in range(256)], dtype=object)
+
+# Colour depths selectable with --color-depth.
+COLOR_DEPTHS = ("24bit", "256", "16", "none")
+
+# The 16 standard terminal colours (xterm defaults), as RGB.
+XTERM_16_COLORS = [
+    (0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0),
+    (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229),
+    (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0),
+    (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255),
+]
+
+# Channel levels of the 6x6x6 colour cube in the 256-colour palette.
+XTERM_CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+
+# Bits per channel of the RGB lookup table used to find palette colours.
+PALETTE_LUT_BITS = 5
+
+# Dithering patterns selectable with --dither.
+DITHER_MODES = ("none", "bayer", "bluenoise")
+
+# Side of the tiled Bayer and blue-noise threshold maps.
+DITHER_MAP_SIZE = 8
+BLUE_NOISE_SIZE = 64
+
+# Cursor and screen control sequences.
+RESET = b'\033[0m'
+ROW_BREAK = b'\033[0m\r\n'
+CURSOR_HOME = b'\033[H'
+CLEAR_SCREEN_CODE = b'\033[2J\033[H'
+HIDE_CURSOR = b'\033[?25l'
+SHOW_CURSOR = b'\033[?25h'
+
+# Share of changed cells above which the delta renderer repaints the whole frame.
+DEFAULT_REPAINT_THRESHOLD = 0.5
+
+# Unchanged cells bridged between two changed runs rather than moving the cursor.
+DELTA_MERGE_GAP = 4
+
+# Stream protocols cv2.VideoCapture can open directly.
+STREAM_PROTOCOLS = ("https", "http", "m3u8", "m3u8_native")
+
+# Location of the resolved stream cache.
+STREAM_CACHE_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                                 "yt-avp", "streams.json")
+
+# Default number of resolved streams kept in the cache.
+DEFAULT_CACHE_SIZE = 64
+
+# Lifetime of a cached stream whose URL carries no expiry of its own (seconds).
+DEFAULT_CACHE_TTL = 3600
+
+# Cached streams this close to expiring are resolved again (seconds).
+CACHE_EXPIRY_MARGIN = 60
+
+# Expiry timestamp embedded in signed stream URLs (query or path style).
+URL_EXPIRE_PATTERN = re.compile(r"[?&/]expire[=/](\d+)")
+
+# Options for the in-process yt-dlp extractor.
+YDL_OPTIONS = {
+    "quiet": True,
+    "no_warnings": True,
+    "noplaylist": True,
+    "skip_download": True,
+}
+
+# Default number of playlist items resolved and opened ahead of playback.
+DEFAULT_PREFETCH_DEPTH = 1
+
+# Pre-rendered frame file layout: header, metadata JSON, frame payloads, frame index.
+FRAME_FILE_MAGIC = b"AVPF"
+FRAME_FILE_VERSION = 1
+# magic, version, columns, rows, fps, frame count, index offset, metadata length
+FRAME_FILE_HEADER = struct.Struct("<4sHHHdIQI")
+# payload offset, payload length, frame flags
+FRAME_INDEX_ENTRY = struct.Struct("<QIB")
+
+# Frame flags: a keyframe repaints the whole grid, a compressed payload is zlib data,
+# and a cut frame starts a new scene.
+FRAME_KEY = 0x01
+FRAME_ZLIB = 0x02
+FRAME_CUT = 0x04
+
+# Mean absolute luma difference (0-255) between consecutive frames that counts as a scene cut.
+SCENE_CUT_THRESHOLD = 20.0
+
+# Default seconds between keyframes in pre-rendered frame files.
+DEFAULT_KEYFRAME_INTERVAL = 2.0
+
+# Default length of a --benchmark run (seconds) and how often it reports memory use.
+DEFAULT_BENCHMARK_SECONDS = 600
+BENCHMARK_SAMPLES = 10
+
+# Grid used by --benchmark when no --max-width/--max-height is given.
+BENCHMARK_GRID = (200, 60)
+
+# Default number of frames buffered between pipeline stages.
+DEFAULT_QUEUE_DEPTH = 4
+
+# Pixels covered by one terminal cell in each render mode, as (columns, rows).
+MODE_CELL_PIXELS = {"glyph": (1, 1), "halfblock": (1, 2), "braille": (2, 4)}
+RENDER_MODES = tuple(MODE_CELL_PIXELS)
+
+# Upper half block: the foreground colours the top pixel of a cell, the background the bottom one.
+HALF_BLOCK_GLYPHS = np.array(["\u2580".encode()], dtype=object)
+
+# Braille patterns U+2800-U+28FF, indexed by their 8-bit dot mask.
+BRAILLE_GLYPHS = np.array([chr(0x2800 + n).encode() for n in range(256)], dtype=object)
+
+# Bit of each dot in a Braille pattern, as (row, column, bit) within the 2x4 block.
+BRAILLE_DOT_BITS = ((0, 0, 0), (1, 0, 1), (2, 0, 2), (0, 1, 3), (1, 1, 4), (2, 1, 5), (3, 0, 6), (3, 1, 7))
+
+# Column scales the bandwidth controller steps through, from full resolution down.
+BANDWIDTH_SCALES = (1.0, 0.75, 0.5)
+
+# Seconds of output the bandwidth controller averages over before each decision.
+BANDWIDTH_WINDOW = 1.0
+
+# Seconds the bandwidth controller waits after a change before changing again.
+BANDWIDTH_HOLD = 3.0
+
+# Step quality back up only while the output rate is below this share of the budget.
+BANDWIDTH_HEADROOM = 0.5
+
+# Share of wall time spent blocked in writes above which the link counts as saturated,
+# and below which it counts as idle.
+WRITE_BUSY_HIGH = 0.5
+WRITE_BUSY_LOW = 0.1
+
+# Chroma subsampling factors (columns, rows) compared by --benchmark.
+CHROMA_BENCHMARK_FACTORS = ((1, 1), (2, 1), (4, 1), (2, 2))
+
+# Frames buffered per --serve client; a client further behind drops frames until the next keyframe.
+CLIENT_QUEUE_DEPTH = 8
+
+# File extensions picked up when batch is given a directory.
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".webm", ".avi", ".mov", ".m4v", ".flv", ".ts", ".mpg", ".mpeg")
+
+# Suffix of the frame file written by a batch job until it is complete.
+PARTIAL_SUFFIX = ".part"
+
+# Default colour precision per channel for the encoder; fewer bits give longer colour runs.
+DEFAULT_COLOR_BITS = 5
+
 def pixel_to_ascii(brightness, gamma=0.5, gradient=DEFAULT_ASCII_GRADIENT):
     """
-    Map a brightness value (0-255) to an ASCII character using gamma correction.
+    Map a brightness value (0-255) to an ASCII character using gamma correction.
+    
+    Args:
+        brightness (int): Pixel brightness (0-255).
+        gamma (float): Gamma correction factor; values < 1.0 boost mid-tones.
+        gradient (str): A string of ASCII characters ordered from darkest to lightest.
+        
+    Returns:
+        str: Corresponding ASCII character.
+    """
+    normalized = brightness / 255.0
+    adjusted = normalized ** gamma
+    index = int(adjusted * (len(gradient) - 1))
+    return gradient[index]
+
+@functools.lru_cache(maxsize=None)
+def gradient_lut(gamma, gradient):
+    """
+    Build the brightness lookup table for a (gamma, gradient) pair.
+    
+    Each entry is computed exactly as pixel_to_ascii() would, so indexing the
+    table with a whole grayscale frame gives the same glyphs as the per-pixel path.
+    
+    Args:
+        gamma (float): Gamma correction factor.
+        gradient (str): A string of ASCII characters ordered from darkest to lightest.
+        
+    Returns:
+        np.ndarray: 256-entry array of gradient indices.
+    """
+    scale = len(gradient) - 1
+    return np.array([int(((b / 255.0) ** gamma) * scale) for b in range(256)], dtype=np.intp)
+
+@functools.lru_cache(maxsize=None)
+def glyph_bytes(gradient):
+    """Return the UTF-8 encoded glyphs of a gradient as an object array."""
+    return np.array([char.encode('utf-8') for char in gradient], dtype=object)
+
+@functools.lru_cache(maxsize=None)
+def quantize_lut(bits):
+    """
+    Build a 256-entry table reducing a colour channel to the given bit depth.
+    
+    The kept high bits are replicated into the low bits, so black and white stay exact.
+    
+    Args:
+        bits (int): Bits of precision to keep per channel (1-8).
+        
+    Returns:
+        numpy.ndarray: uint8 table of quantized channel values.
+    """
+    if not 1 <= bits <= 8:
+        raise ValueError(f"color bits must be between 1 and 8, got {bits}")
+    values = (np.arange(256) >> (8 - bits)) << (8 - bits)
+    filled = bits
+    while filled < 8:
+        values |= values >> filled
+        filled *= 2
+    return values.astype(np.uint8)
+
+def xterm_256_colors():
+    """Return the RGB values of the 256-colour palette: 16 system colours, the 6x6x6 cube and 24 grays."""
+    colors = list(XTERM_16_COLORS)
+    for r in XTERM_CUBE_LEVELS:
+        for g in XTERM_CUBE_LEVELS:
+            for b in XTERM_CUBE_LEVELS:
+                colors.append((r, g, b))
+    colors.extend((v, v, v) for v in range(8, 248, 10))
+    return colors
+
+@functools.lru_cache(maxsize=None)
+def palette_tables(depth):
+    """
+    Build the colour lookup table and escape table for an indexed colour depth.
+    
+    The lookup table has one entry per cell of a 32x32x32 RGB grid, holding the
+    index of the nearest palette colour, so a whole frame is mapped to palette
+    indices with a single NumPy indexing step.
+    
+    Args:
+        depth (str): '256' or '16'.
+    
+    Returns:
+        tuple: (lut, escapes, background_escapes) where lut is indexed by
+        (r5 << 10) | (g5 << 5) | b5 and the escape tables are object arrays indexed
+        by palette index.
+    """
+    if depth == "256":
+        colors = xterm_256_colors()
+        # Terminals often redefine the 16 system colours, so only match the cube and grays.
+        first = 16
+        escapes = [b'\033[38;5;%dm' % i for i in range(256)]
+        background_escapes = [b'\033[48;5;%dm' % i for i in range(256)]
+    elif depth == "16":
+        colors = XTERM_16_COLORS
+        first = 0
+        escapes = [b'\033[%dm' % (30 + i) for i in range(8)] + [b'\033[%dm' % (90 + i) for i in range(8)]
+        background_escapes = [b'\033[%dm' % (40 + i) for i in range(8)] + [b'\033[%dm' % (100 + i) for i in range(8)]
+    else:
+        raise ValueError(f"no palette for colour depth '{depth}'")
+    levels = np.arange(2 ** PALETTE_LUT_BITS)
+    # Cell centres, with the top level at full intensity.
+    centres = (levels << 3) | (levels >> 2)
+    grid = np.stack(np.meshgrid(centres, centres, centres, indexing="ij"), axis=-1).reshape(-1, 1, 3)
+    palette = np.array(colors[first:], dtype=np.int32).reshape(1, -1, 3)
+    lut = np.empty(len(grid), dtype=np.int32)
+    # Match in slices to keep the distance matrix small.
+    for start in range(0, len(grid), 4096):
+        distance = ((grid[start:start + 4096] - palette) ** 2).sum(axis=2)
+        lut[start:start + 4096] = distance.argmin(axis=1) + first
+    return lut, np.array(escapes, dtype=object), np.array(background_escapes, dtype=object)
+
+@functools.lru_cache(maxsize=None)
+def bayer_matrix(size=DITHER_MAP_SIZE):
+    """Return the size x size Bayer ordered-dither index matrix (values 0 to size**2 - 1)."""
+    matrix = np.zeros((1, 1), dtype=np.int32)
+    while matrix.shape[0] < size:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+@functools.lru_cache(maxsize=None)
+def blue_noise(size=BLUE_NOISE_SIZE, seed=1):
+    """
+    Return a size x size blue-noise-like rank matrix (values 0 to size**2 - 1).
+    
+    Seeded white noise is high-pass filtered in the frequency domain, which pushes
+    its energy to fine detail, and then ranked so every threshold appears once.
+    """
+    noise = np.random.default_rng(seed).random((size, size))
+    fy = np.fft.fftfreq(size)[:, None]
+    fx = np.fft.fftfreq(size)[None, :]
+    # Suppress low frequencies with a Gaussian notch around DC.
+    high_pass = 1.0 - np.exp(-(fx ** 2 + fy ** 2) / (2 * 0.1 ** 2))
+    filtered = np.real(np.fft.ifft2(np.fft.fft2(noise) * high_pass))
+    return filtered.ravel().argsort().argsort().reshape(size, size).astype(np.int32)
+
+def threshold_map(kind):
+    """Return the dither threshold map for a pattern, with values in (-0.5, 0.5)."""
+    ranks = bayer_matrix() if kind == "bayer" else blue_noise()
+    return (ranks + 0.5) / ranks.size - 0.5
+
+def dot_thresholds(kind, gamma):
+    """
+    Return the brightness thresholds above which a Braille dot is lit.
+    
+    A dot is lit where its gamma-corrected brightness exceeds the (possibly
+    dithered) threshold; the gamma is folded into the map, so the raw grayscale
+    values can be compared against it directly.
+    
+    Args:
+        kind (str): One of DITHER_MODES.
+        gamma (float): Gamma correction factor.
+    
+    Returns:
+        numpy.ndarray: uint8 threshold map (1x1 when not dithering).
+    """
+    levels = np.full((1, 1), 0.5) if kind == "none" else threshold_map(kind) + 0.5
+    return np.minimum(255 * levels ** (1 / gamma), 255).astype(np.uint8)
+
+def mode_glyphs(mode, gradient):
+    """Return the glyph table a render mode draws with."""
+    if mode == "halfblock":
+        return HALF_BLOCK_GLYPHS
+    if mode == "braille":
+        return BRAILLE_GLYPHS
+    return glyph_bytes(gradient)
+
+class Ditherer:
+    """
+    Ordered dithering of a BGR grid ahead of colour quantization.
+    
+    A fixed threshold map is tiled over the grid, anchored to the top-left cell, and
+    added to every channel in a single NumPy broadcast. Because the pattern does not
+    move, unchanged regions dither the same way in every frame and do not show up
+    as changes in delta output. With chroma subsampling the map is tiled over the
+    blocks instead, so every cell of a block keeps the same colour.
+    """
+    
+    def __init__(self, kind, step, block=(1, 1)):
+        """
+        Args:
+            kind (str): 'bayer' or 'bluenoise'.
+            step (float): Spacing of the target colour levels; the dither amplitude.
+            block (tuple): (columns, rows) of cells sharing one threshold, as in chroma subsampling.
+        """
+        self.kind = kind
+        self.step = step
+        self.block = tuple(block)
+        self.shape = None
+    
+    def prepare(self, shape):
+        """Build the tiled offsets and output buffer for a (h, w, 3) grid."""
+        if shape != self.shape:
+            self.shape = shape
+            height, width = shape[:2]
+            block_columns, block_rows = self.block
+            pattern = threshold_map(self.kind)
+            blocks = (-(-height // block_rows), -(-width // block_columns))
+            reps = (-(-blocks[0] // pattern.shape[0]), -(-blocks[1] // pattern.shape[1]))
+            tiled = np.tile(pattern, reps)[:blocks[0], :blocks[1]]
+            tiled = tiled.repeat(block_rows, axis=0).repeat(block_columns, axis=1)[:height, :width]
+            self.offsets = np.rint(tiled * self.step).astype(np.int16)[:, :, None]
+            self.dithered = np.empty(shape, dtype=np.int16)
+    
+    def apply(self, bgr, rows=None):
+        """
+        Dither a BGR grid, or the band of rows of a grid passed to prepare().
+        
+        Returns:
+            numpy.ndarray: int16 array (h, w, 3), possibly outside 0-255; clip when indexing.
+        """
+        if rows is None:
+            self.prepare(bgr.shape)
+            rows = slice(None)
+        np.add(bgr, self.offsets[rows], out=self.dithered[rows])
+        return self.dithered[rows]
+
+class TrueColorPalette:
+    """24-bit colour escapes, with each channel quantized to the given number of bits."""
+    
+    # Bits per channel when colours are packed into keys; keys are the packed colours themselves.
+    shift = 8
+    lut = None
+    
+    def __init__(self, bits=DEFAULT_COLOR_BITS):
+        self.channel_lut = quantize_lut(bits)
+        self.dither_step = 256 >> bits
+    
+    def escapes(self, keys, background=False):
+        """Return the escape selecting each packed colour key."""
+        red = BG_RED_ESCAPE_BYTES if background else RED_ESCAPE_BYTES
+        return red[keys >> 16] + GREEN_ESCAPE_BYTES[(keys >> 8) & 0xFF] + BLUE_ESCAPE_BYTES[keys & 0xFF]
+
+class IndexedPalette:
+    """256- or 16-colour escapes, picked through a precomputed RGB lookup table."""
+    
+    shift = PALETTE_LUT_BITS
+    
+    def __init__(self, depth):
+        self.channel_lut = (np.arange(256) >> (8 - PALETTE_LUT_BITS)).astype(np.uint8)
+        self.lut, self.escape_table, self.background_table = palette_tables(depth)
+        # Roughly the distance between neighbouring palette colours.
+        self.dither_step = 48 if depth == "256" else 128
+    
+    def escapes(self, keys, background=False):
+        """Return the escape selecting each palette index."""
+        return (self.background_table if background else self.escape_table)[keys]
+
+class NoColorPalette:
+    """Glyphs only, without any colour escapes."""
+    
+    shift = 0
+    lut = None
+    channel_lut = np.zeros(256, dtype=np.uint8)
+    dither_step = 0
+    
+    def escapes(self, keys, background=False):
+        return np.full(len(keys), b'', dtype=object)
+
+def make_palette(depth="24bit", color_bits=DEFAULT_COLOR_BITS):
+    """
+    Create the palette for a colour depth.
+    
+    Args:
+        depth (str): One of COLOR_DEPTHS.
+        color_bits (int): Bits of precision per channel for '24bit'.
+    """
+    if depth == "24bit":
+        return TrueColorPalette(color_bits)
+    if depth == "none":
+        return NoColorPalette()
+    return IndexedPalette(depth)
+
+def changed_runs(changed, merge_gap=DELTA_MERGE_GAP):
+    """
+    Find horizontal runs of changed cells.
+    
+    Runs on the same line separated by at most merge_gap unchanged cells are merged,
+    since rewriting a few cells is cheaper than another cursor-positioning escape.
+    
+    Args:
+        changed: Boolean array (h, w) of changed cells.
+        merge_gap (int): Largest gap of unchanged cells to bridge.
+    
+    Returns:
+        tuple: Arrays (ys, x_starts, x_ends) with exclusive ends.
+    """
+    height, width = changed.shape
+    # Pad every line with an unchanged cell so runs never wrap onto the next line.
+    padded = np.zeros((height, width + 1), dtype=np.int8)
+    padded[:, :width] = changed
+    edges = np.diff(padded.ravel(), prepend=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts) > 1:
+        merge = ((starts[1:] // (width + 1) == ends[:-1] // (width + 1))
+                 & (starts[1:] - ends[:-1] <= merge_gap))
+        starts = starts[np.concatenate(([True], ~merge))]
+        ends = ends[np.concatenate((~merge, [True]))]
+    return starts // (width + 1), starts % (width + 1), ends % (width + 1)
+
+class ColorChannel:
+    """
+    Per-cell colour state for one channel (foreground or background) of a DeltaRenderer.
+    
+    Holds the palette keys of the emitted and the incoming frame, and marks where a
+    colour run starts, in buffers allocated once per grid size. Methods taking rows
+    only touch that band, so bands can be processed concurrently.
+    """
+    
+    def __init__(self, palette, ditherer, shape, background=False):
+        height, width = shape
+        self.palette = palette
+        self.ditherer = ditherer
+        if ditherer is not None:
+            ditherer.prepare((height, width, 3))
+        self.background = background
+        self.keys = np.empty(shape, dtype=np.int32)
+        self.new_keys = np.empty(shape, dtype=np.int32)
+        self.packed = np.empty(shape, dtype=np.int32)
+        self.quantized = np.empty((height, width, 3), dtype=np.uint8)
+        self.starts = np.empty(shape, dtype=bool)
+    
+    def update(self, bgr, rows=slice(None)):
+        """Compute the palette keys and colour run starts of a band of an incoming BGR grid."""
+        palette, quantized, keys, starts = self.palette, self.quantized[rows], self.new_keys[rows], self.starts[rows]
+        if self.ditherer is not None:
+            bgr = self.ditherer.apply(bgr, rows)
+        np.take(palette.channel_lut, bgr, out=quantized, mode='clip')
+        # Pack each colour into one comparable key: (r << 2 * shift) | (g << shift) | b.
+        packed = keys if palette.lut is None else self.packed[rows]
+        np.copyto(packed, quantized[:, :, 2])
+        packed <<= palette.shift
+        packed |= quantized[:, :, 1]
+        packed <<= palette.shift
+        packed |= quantized[:, :, 0]
+        if palette.lut is not None:
+            np.take(palette.lut, packed, out=keys, mode='clip')
+        # A colour run starts at the first cell of a line or wherever the colour changes.
+        starts[:, 0] = True
+        np.not_equal(keys[:, 1:], keys[:, :-1], out=starts[:, 1:])
+    
+    def mark_changes(self, changed, scratch, rows=slice(None)):
+        """OR the cells of a band whose colour differs from the emitted frame into changed."""
+        np.not_equal(self.new_keys[rows], self.keys[rows], out=scratch)
+        changed |= scratch
+    
+    def escapes(self, ys, xs):
+        """Return the escapes for the cells at (ys, xs)."""
+        return self.palette.escapes(self.new_keys[ys, xs], background=self.background)
+    
+    def commit(self):
+        """Make the incoming keys the emitted ones."""
+        self.keys, self.new_keys = self.new_keys, self.keys
+
+class DeltaRenderer:
+    """
+    Terminal output stage that only rewrites the cells that changed.
+    
+    The renderer remembers the glyph and colours of every cell it has emitted. Each
+    new frame is compared against that grid and only the changed runs are written,
+    using cursor-positioning escapes. When more than repaint_threshold of the cells
+    changed, or the grid size changed, the whole frame is repainted instead.
+    
+    Cells have a foreground colour and optionally a background colour. Colours are
+    optionally dithered, mapped through a palette (see make_palette()), and within a
+    line an escape is only emitted where a channel's colour differs from the
+    previous cell. All per-frame arrays are allocated once per grid size and reused.
+    """
+    
+    def __init__(self, glyphs, palette=None, repaint_threshold=DEFAULT_REPAINT_THRESHOLD, dither="none",
+                 workers=1, chroma=(1, 1)):
+        """
+        Args:
+            glyphs: Object array of encoded glyphs, indexed by the frame's glyph indices.
+            palette: Palette from make_palette() (default: 24-bit colour).
+            repaint_threshold (float): Share of changed cells above which the frame is repainted.
+            dither (str): One of DITHER_MODES.
+            workers (int): Threads that quantize and encode horizontal bands of the frame concurrently.
+            chroma (tuple): The converter's chroma subsampling, so dithering keeps its blocks uniform.
+        """
+        self.glyphs = glyphs
+        self.dither = dither
+        self.chroma = tuple(chroma)
+        self.set_palette(palette or make_palette())
+        self.repaint_threshold = repaint_threshold
+        self.workers = max(workers, 1)
+        self.pool = None
+        if self.workers > 1:
+            self.pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="avp-band")
+        self.shape = None
+        self.channels = []
+        self.generation = terminal.generation
+        self.last_was_full = False
+        self.force_repaint = False
+    
+    def close(self):
+        """Shut down the band worker threads."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+    
+    def reset(self):
+        """Forget the emitted grid so the next frame is a full repaint."""
+        self.shape = None
+    
+    def request_repaint(self):
+        """Make the next frame a full repaint without clearing the screen first."""
+        self.force_repaint = True
+    
+    def set_palette(self, palette):
+        """Switch to another palette; the next frame is a full repaint."""
+        self.palette = palette
+        self.ditherer = None
+        if self.dither != "none" and palette.dither_step:
+            self.ditherer = Ditherer(self.dither, palette.dither_step, block=self.chroma)
+        self.reset()
+    
+    def _allocate(self, shape, background):
+        height, width = shape
+        self.shape = shape
+        self.indices = np.empty(shape, dtype=np.intp)
+        self.channels = [ColorChannel(self.palette, self.ditherer, shape)]
+        if background:
+            self.channels.append(ColorChannel(self.palette, self.ditherer, shape, background=True))
+        self.changed = np.empty(shape, dtype=bool)
+        self.scratch = np.empty(shape, dtype=bool)
+        # Escapes sit in the even slots and glyphs in the odd ones, so a line is one slice.
+        self.cells = np.empty((height, 2 * width + 1), dtype=object)
+        self.cells[:, 2 * width] = ROW_BREAK
+        self.cells[-1, 2 * width] = RESET
+        bounds = np.linspace(0, height, min(self.workers, height) + 1).astype(int).tolist()
+        self.bands = [slice(start, end) for start, end in zip(bounds, bounds[1:])]
+    
+    def _map(self, function):
+        """Apply function to every band, concurrently when there is a pool, and return the results in order."""
+        if self.pool is None or len(self.bands) == 1:
+            return [function(rows) for rows in self.bands]
+        return list(self.pool.map(function, self.bands))
+    
+    def render(self, indices, fg, bg=None):
+        """
+        Encode a frame as the bytes needed to bring the terminal up to date.
+        
+        Args:
+            indices: Array (h, w) of indices into the glyph table.
+            fg: Array (h, w, 3) of BGR foreground colours.
+            bg: Array (h, w, 3) of BGR background colours (optional).
+        
+        Returns:
+            bytes: Terminal output for this frame (empty if nothing changed).
+        """
+        prefix = CURSOR_HOME
+        # After a resize the terminal may have reflowed what is on screen, so nothing can be reused.
+        if self.generation != terminal.generation:
+            self.generation = terminal.generation
+            self.reset()
+        if self.shape != indices.shape or len(self.channels) != (1 if bg is None else 2):
+            self._allocate(indices.shape, bg is not None)
+            prefix = CLEAR_SCREEN_CODE
+        cleared = prefix is CLEAR_SCREEN_CODE
+        
+        def compare(rows):
+            for channel, bgr in zip(self.channels, (fg, bg)):
+                channel.update(bgr[rows], rows)
+            if cleared:
+                return 0
+            changed = self.changed[rows]
+            np.not_equal(indices[rows], self.indices[rows], out=changed)
+            for channel in self.channels:
+                channel.mark_changes(changed, self.scratch[rows], rows)
+            return np.count_nonzero(changed)
+        
+        changed = sum(self._map(compare))
+        self.last_was_full = cleared or self.force_repaint or changed > self.repaint_threshold * self.changed.size
+        if self.last_was_full:
+            output = b''.join([prefix] + self._map(lambda rows: self._full_band(indices, rows)))
+        else:
+            output = b''.join(self._map(lambda rows: self._delta_band(indices, rows)))
+            if output:
+                output += RESET
+        self.force_repaint = False
+        np.copyto(self.indices, indices)
+        for channel in self.channels:
+            channel.commit()
+        return output
+    
+    def _encode(self, indices, rows):
+        """Fill a band's cell slots with glyphs and the colour escapes marked in each channel's starts."""
+        width = self.shape[1]
+        cells = self.cells[rows]
+        np.take(self.glyphs, indices[rows], out=cells[:, 1:2 * width:2], mode='clip')
+        cells[:, 0:2 * width:2] = b''
+        for channel in self.channels:
+            ys, xs = np.nonzero(channel.starts[rows])
+            cells[ys, 2 * xs] = cells[ys, 2 * xs] + channel.escapes(ys + rows.start, xs)
+    
+    def _full_band(self, indices, rows):
+        self._encode(indices, rows)
+        return b''.join(self.cells[rows].ravel().tolist())
+    
+    def _delta_band(self, indices, rows):
+        ys, x_starts, x_ends = changed_runs(self.changed[rows])
+        if len(ys) == 0:
+            return b''
+        ys += rows.start
+        # The colour state is unknown where a run begins, so every run opens with escapes.
+        for channel in self.channels:
+            channel.starts[ys, x_starts] = True
+        self._encode(indices, rows)
+        chunks = []
+        for y, x0, x1 in zip(ys.tolist(), x_starts.tolist(), x_ends.tolist()):
+            chunks.append(b'\033[%d;%dH' % (y + 1, x0 + 1))
+            chunks.extend(self.cells[y, 2 * x0:2 * x1].tolist())
+        return b''.join(chunks)
+
+class SceneCutDetector:
+    """
+    Detect hard cuts from the mean absolute difference of consecutive luma grids.
+    
+    The luma is the converter's downscaled grayscale frame, so a check costs one
+    L1 norm and one copy over a few thousand pixels. Only the frame where the
+    difference first rises above the threshold is a cut, so fast motion that stays
+    above it does not report a cut on every frame.
+    """
+    
+    def __init__(self, threshold=SCENE_CUT_THRESHOLD):
+        """
+        Args:
+            threshold (float): Mean absolute luma difference (0-255) that counts as a cut.
+        """
+        self.threshold = threshold
+        self.times = []
+        self.reset()
+    
+    def reset(self):
+        """Forget the previous frame, e.g. at the start of an unrelated run of frames."""
+        self.previous = None
+        self.score = 0.0
+        self.cut = False
+    
+    def update(self, luma):
+        """
+        Compare a luma grid with the previous one.
+        
+        Returns:
+            bool: True if this frame starts a new scene (also kept in cut).
+        """
+        import cv2
+        
+        if self.previous is None or self.previous.shape != luma.shape:
+            self.previous = luma.copy()
+            self.score = 0.0
+            self.cut = False
+            return False
+        score = cv2.norm(luma, self.previous, cv2.NORM_L1) / luma.size
+        np.copyto(self.previous, luma)
+        self.cut = score > self.threshold >= self.score
+        self.score = score
+        return self.cut
+
+def cut_times(flags, fps):
+    """Return the timestamps in seconds of the frames whose flags mark a scene cut."""
+    return [number / fps for number, frame_flags in enumerate(flags) if frame_flags & FRAME_CUT]
+
+class FrameConverter:
+    """
+    Convert BGR frames to glyph indices at cell resolution using persistent buffers.
+    
+    The grid is worked out once and again only when the frame size changes or the
+    terminal is resized. The resized frame, its brightness and the glyph indices
+    are written into arrays that are only reallocated when the grid changes, and
+    the frame is kept in OpenCV's BGR order throughout instead of being converted
+    to RGB.
+    
+    In 'halfblock' mode the frame is resized to two pixels per cell vertically;
+    the top pixel becomes the foreground and the bottom one the background of an
+    upper half block, and the brightness is not used.
+    
+    In 'braille' mode the frame is resized to 2x4 pixels per cell, every pixel is
+    thresholded into a dot and each block is packed into its 8-bit Braille
+    pattern with shifts and ORs; the cell colour is the block average.
+    
+    With chroma subsampling the colours are averaged over blocks of cells and every
+    cell of a block gets the same colour, so the renderer's run coalescing emits one
+    escape per block; glyphs still come from the full-resolution brightness.
+    
+    With a SceneCutDetector the grayscale frame is also checked for cuts; cut then
+    tells whether the last converted frame starts a new scene.
+    """
+    
+    def __init__(self, lut, max_width=None, max_height=None, columns=None, mode="glyph", prescaled=False,
+                 gamma=0.5, dither="none", chroma=(1, 1), scene_cuts=None):
+        """
+        Args:
+            lut: Brightness lookup table from gradient_lut().
+            max_width (int): Maximum width for the ASCII output (optional).
+            max_height (int): Maximum height for the ASCII output (optional).
+            columns (int): Fixed number of columns instead of following the terminal (optional).
+            mode (str): One of RENDER_MODES.
+            prescaled (bool): Frames already arrive at the pixel grid (e.g. from FFmpegCapture).
+            gamma (float): Gamma correction factor for Braille dots.
+            dither (str): One of DITHER_MODES, applied to Braille dots.
+            chroma (tuple): Cells (columns, rows) sharing one colour; not used in 'halfblock' mode.
+            scene_cuts (SceneCutDetector): Detector fed with every grayscale frame (optional).
+        """
+        self.lut = lut
+        self.max_width = max_width
+        self.max_height = max_height
+        self.columns = columns
+        self.mode = mode
+        self.prescaled = prescaled
+        self.scale = 1.0
+        self.chroma = tuple(chroma)
+        self.scene_cuts = scene_cuts
+        self.cut = False
+        self.thresholds = dot_thresholds(dither, gamma) if mode == "braille" else None
+        self.frame_shape = None
+        self.generation = None
+        self.grid = None
+    
+    def _allocate(self, grid):
+        columns, rows = grid
+        self.grid = grid
+        self.pixels = pixel_grid(grid, self.mode)
+        self.resized = np.empty((self.pixels[1], self.pixels[0], 3), dtype=np.uint8)
+        self.gray = np.empty((self.pixels[1], self.pixels[0]), dtype=np.uint8)
+        self.indices = np.zeros((rows, columns), dtype=np.intp)
+        if self.mode == "braille":
+            self.cell_bgr = np.empty((rows, columns, 3), dtype=np.uint8)
+            self.dots = np.empty(self.gray.shape, dtype=bool)
+            self.pattern = np.empty((rows, columns), dtype=np.uint8)
+            self.dot_bits = np.empty((rows, columns), dtype=np.uint8)
+            reps = (-(-self.pixels[1] // self.thresholds.shape[0]), -(-self.pixels[0] // self.thresholds.shape[1]))
+            self.tiled_thresholds = np.tile(self.thresholds, reps)[:self.pixels[1], :self.pixels[0]]
+        if self.chroma != (1, 1):
+            chroma_columns, chroma_rows = self.chroma
+            blocks = (-(-rows // chroma_rows), -(-columns // chroma_columns))
+            self.chroma_small = np.empty(blocks + (3,), dtype=np.uint8)
+            self.chroma_full = np.empty((blocks[0] * chroma_rows, blocks[1] * chroma_columns, 3), dtype=np.uint8)
+    
+    def convert(self, frame):
+        """
+        Resize a frame to the cell grid and map its brightness to glyphs.
+        
+        Args:
+            frame: Image frame (BGR as read by OpenCV).
+        
+        Returns:
+            tuple: (indices, bgr) views of the converter's buffers, valid until the next
+            call; in 'halfblock' mode (indices, fg, bg).
+        """
+        import cv2
+        
+        # The grid only changes with the frame size or when the terminal is resized.
+        terminal.poll()
+        if frame.shape != self.frame_shape or terminal.generation != self.generation:
+            self.frame_shape = frame.shape
+            self.generation = terminal.generation
+            height, width = frame.shape[:2]
+            if self.prescaled:
+                cell_width, cell_height = MODE_CELL_PIXELS[self.mode]
+                grid = (max(int(width // cell_width * self.scale), 1),
+                        max(int(height // cell_height * self.scale), 1))
+            else:
+                if self.columns:
+                    columns, max_height = self.columns, self.max_height
+                else:
+                    columns, max_height = output_columns(self.max_width), output_rows(self.max_height)
+                grid = cell_grid(height, width, max(int(columns * self.scale), 1), max_height)
+            if grid != self.grid:
+                self._allocate(grid)
+        if frame.shape[:2] == self.resized.shape[:2]:
+            np.copyto(self.resized, frame)
+        else:
+            cv2.resize(frame, self.pixels, dst=self.resized)
+        if self.mode != "halfblock" or self.scene_cuts is not None:
+            cv2.cvtColor(self.resized, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        if self.scene_cuts is not None:
+            self.cut = self.scene_cuts.update(self.gray)
+        if self.mode == "halfblock":
+            return self.indices, self.resized[0::2], self.resized[1::2]
+        if self.mode == "braille":
+            return self._braille()
+        np.take(self.lut, self.gray, out=self.indices, mode='clip')
+        return self.indices, self._subsample(self.resized)
+    
+    def set_scale(self, scale):
+        """Draw on a grid scale times as wide as normal, from the next frame on."""
+        self.scale = scale
+        self.frame_shape = None
+    
+    def _braille(self):
+        import cv2
+        
+        np.greater(self.gray, self.tiled_thresholds, out=self.dots)
+        dots = self.dots.view(np.uint8)
+        pattern, bits = self.pattern, self.dot_bits
+        pattern.fill(0)
+        for row, column, bit in BRAILLE_DOT_BITS:
+            np.left_shift(dots[row::4, column::2], bit, out=bits)
+            pattern |= bits
+        np.copyto(self.indices, pattern)
+        cv2.resize(self.resized, self.grid, dst=self.cell_bgr, interpolation=cv2.INTER_AREA)
+        return self.indices, self._subsample(self.cell_bgr)
+    
+    def _subsample(self, bgr):
+        """Average colours over chroma blocks and spread each average back over its block."""
+        import cv2
+        
+        if self.chroma == (1, 1):
+            return bgr
+        chroma_columns, chroma_rows = self.chroma
+        small, full = self.chroma_small, self.chroma_full
+        cv2.resize(bgr, (small.shape[1], small.shape[0]), dst=small, interpolation=cv2.INTER_AREA)
+        blocks = full.reshape(small.shape[0], chroma_rows, small.shape[1], chroma_columns, 3)
+        np.copyto(blocks, small[:, None, :, None, :])
+        return full[:bgr.shape[0], :bgr.shape[1]]
+
+def get_terminal_size():
+    """Get the terminal window size."""
+    columns, rows = shutil.get_terminal_size()
+    return columns, rows
+
+class TerminalWatcher:
+    """
+    Keep track of the terminal size without querying it on every frame.
+    
+    Once watch() has installed a SIGWINCH handler, the size is only read again
+    when the terminal is resized, and generation is bumped so per-grid state can
+    be rebuilt. Where SIGWINCH does not exist (Windows), watch() falls back to
+    polling: poll() queries the size once per frame and bumps generation when it
+    changed. Until watch() is called the size is queried on each access.
+    """
+    
+    def __init__(self):
+        self.generation = 0
+        self.watching = False
+        self.polling = False
+        self._size = None
+    
+    def watch(self):
+        """Start following resizes; must be called from the main thread."""
+        self._size = get_terminal_size()
+        if hasattr(signal, "SIGWINCH"):
+            signal.signal(signal.SIGWINCH, self._on_resize)
+            self.watching = True
+        else:
+            self.polling = True
+    
+    def poll(self):
+        """Without SIGWINCH, pick up a resize by querying the size; call once per frame."""
+        if self.polling:
+            size = get_terminal_size()
+            if size != self._size:
+                self._size = size
+                self.generation += 1
+    
+    @property
+    def size(self):
+        """The terminal size as (columns, rows)."""
+        if not (self.watching or self.polling):
+            return get_terminal_size()
+        return self._size
+    
+    def _on_resize(self, signum, frame):
+        self._size = get_terminal_size()
+        self.generation += 1
+
+# The terminal the player draws on.
+terminal = TerminalWatcher()
+
+def output_columns(max_width=None):
+    """Return the number of columns to draw, bounded by the terminal and max_width."""
+    term_width, term_height = terminal.size
+    return min(term_width, max_width) if max_width else term_width
+
+def output_rows(max_height=None):
+    """
+    Return the most rows to draw, bounded by the terminal and max_height.
+    
+    The renderer positions the cursor absolutely, so a grid taller than the
+    terminal would scroll on a full repaint and put every later delta on the
+    wrong row.
+    """
+    term_width, term_height = terminal.size
+    return min(term_height, max_height) if max_height else term_height
+
+def cell_grid(height, width, columns, max_height=None):
+    """
+    Compute the cell grid a frame is drawn on.
+    
+    Args:
+        height (int): Frame height in pixels.
+        width (int): Frame width in pixels.
+        columns (int): Number of columns to draw.
+        max_height (int): Maximum number of rows (optional).
+    
+    Returns:
+        tuple: (columns, rows) of the grid.
+    """
+    aspect_ratio = height / width
+    # Calculate rows from aspect ratio and scale factor (0.55 approximates terminal character aspect ratio).
+    rows = int(aspect_ratio * columns * 0.55)
+    if max_height:
+        rows = min(rows, max_height)
+    return columns, rows
+
+def pixel_grid(grid, mode="glyph"):
+    """Return the (width, height) in pixels that a cell grid covers in a render mode."""
+    columns, rows = grid
+    cell_width, cell_height = MODE_CELL_PIXELS[mode]
+    return columns * cell_width, rows * cell_height
+
+class PlaybackClock:
+    """
+    Schedule frames against a monotonic wall clock using their presentation timestamps.
+    
+    The clock starts when the first frame is presented. Every later frame is due at
+    its timestamp relative to that first one, so time spent decoding, converting or
+    writing never accumulates into drift. Frames that are already more than
+    late_tolerance behind their deadline before they are decoded should be dropped.
+    """
+    
+    def __init__(self, late_tolerance):
+        """
+        Args:
+            late_tolerance (float): Seconds a frame may miss its deadline and still count as on time.
+        """
+        self.late_tolerance = late_tolerance
+        self.origin = None
+        self.dropped = 0
+        self.late = 0
+        self.on_time = 0
+    
+    def restart(self, late_tolerance=None):
+        """Start timing a new stream, keeping the frame counts."""
+        if late_tolerance is not None:
+            self.late_tolerance = late_tolerance
+        self.origin = None
+    
+    def is_behind(self, pts):
+        """Return True if a frame with this timestamp can no longer be shown on time."""
+        return self.origin is not None and time.monotonic() > self.origin + pts + self.late_tolerance
+    
+    def drop(self):
+        """Count a frame skipped without being decoded."""
+        self.dropped += 1
+    
+    def wait(self, pts):
+        """Sleep until the frame with this timestamp is due."""
+        now = time.monotonic()
+        if self.origin is None:
+            self.origin = now - pts
+            return
+        delay = self.origin + pts - now
+        if delay > 0:
+            time.sleep(delay)
+    
+    def presented(self, pts):
+        """Record whether a frame reached the terminal on time."""
+        if time.monotonic() > self.origin + pts + self.late_tolerance:
+            self.late += 1
+        else:
+            self.on_time += 1
+    
+    def summary(self):
+        """Return a one-line report of the frame counts."""
+        return f"Frames: {self.on_time} on time, {self.late} late, {self.dropped} dropped."
+
+class BandwidthController:
+    """
+    Adapt resolution, colour depth and repaint threshold to the output link.
+    
+    The output stage reports the size of every frame and how long writing it
+    blocked. Once per BANDWIDTH_WINDOW the controller compares the output rate
+    with the budget (if any) and the share of time spent blocked in writes: a
+    saturated link steps one level down the quality ladder, an idle one steps
+    back up. Steps are held for BANDWIDTH_HOLD seconds, and stepping up needs
+    the rate to fall well below the budget, so the level does not oscillate.
+    The conversion stage picks up a new level before its next frame.
+    """
+    
+    def __init__(self, converter, renderer, max_kbps=None, color_depth="24bit", color_bits=DEFAULT_COLOR_BITS):
+        """
+        Args:
+            converter (FrameConverter): Converter whose grid is scaled.
+            renderer (DeltaRenderer): Renderer whose palette and repaint threshold are changed.
+            max_kbps (float): Output budget in kilobits per second, or None to react to blocked writes only.
+            color_depth (str): Colour depth at the top of the ladder; one of COLOR_DEPTHS.
+            color_bits (int): Bits per channel for 24-bit colour.
+        """
+        self.converter = converter
+        self.renderer = renderer
+        self.budget = max_kbps * 1000 / 8 if max_kbps else None
+        self.color_bits = color_bits
+        self.ladder = self.quality_ladder(color_depth, renderer.repaint_threshold)
+        self.level = 0
+        self.applied = 0
+        self.changes = 0
+        self.hold_until = 0.0
+        self.window_start = None
+        self.window_bytes = 0
+        self.window_blocked = 0.0
+        self.total_bytes = 0
+        self.started = None
+    
+    @staticmethod
+    def quality_ladder(color_depth, repaint_threshold):
+        """
+        Build the list of (scale, color_depth, repaint_threshold) levels, best first.
+        
+        Colour depth and resolution are reduced alternately, and the repaint
+        threshold rises towards 1 so lower levels prefer cheaper delta frames.
+        Colour is never switched off unless it already was.
+        """
+        depths = [d for d in COLOR_DEPTHS[COLOR_DEPTHS.index(color_depth):] if d != "none"] or [color_depth]
+        steps = [(BANDWIDTH_SCALES[0], depths[0])]
+        scales, depths = list(BANDWIDTH_SCALES[1:]), depths[1:]
+        while scales or depths:
+            scale, depth = steps[-1]
+            if depths and (len(steps) % 2 or not scales):
+                depth = depths.pop(0)
+            else:
+                scale = scales.pop(0)
+            steps.append((scale, depth))
+        last = len(steps) - 1
+        return [(scale, depth, repaint_threshold + (1.0 - repaint_threshold) * i / last)
+                for i, (scale, depth) in enumerate(steps)]
+    
+    def apply(self):
+        """Switch the converter and renderer to the current level; call from the conversion stage."""
+        level = self.level
+        if level == self.applied:
+            return
+        old_scale, old_depth, _ = self.ladder[self.applied]
+        scale, depth, threshold = self.ladder[level]
+        if scale != old_scale:
+            self.converter.set_scale(scale)
+        if depth != old_depth:
+            self.renderer.set_palette(make_palette(depth, self.color_bits))
+        self.renderer.repaint_threshold = threshold
+        self.applied = level
+    
+    def record(self, size, blocked):
+        """
+        Account for one written frame; call from the output stage.
+        
+        Args:
+            size (int): Bytes written.
+            blocked (float): Seconds spent in write() and flush().
+        """
+        now = time.monotonic()
+        if self.window_start is None:
+            self.window_start = self.started = now
+        self.window_bytes += size
+        self.window_blocked += blocked
+        self.total_bytes += size
+        elapsed = now - self.window_start
+        if elapsed < BANDWIDTH_WINDOW:
+            return
+        rate = self.window_bytes / elapsed
+        busy = self.window_blocked / elapsed
+        self.window_start, self.window_bytes, self.window_blocked = now, 0, 0.0
+        if now < self.hold_until:
+            return
+        saturated = busy > WRITE_BUSY_HIGH or (self.budget is not None and rate > self.budget)
+        idle = busy < WRITE_BUSY_LOW and (self.budget is None or rate < self.budget * BANDWIDTH_HEADROOM)
+        if saturated and self.level < len(self.ladder) - 1:
+            self.level += 1
+        elif idle and self.level > 0:
+            self.level -= 1
+        else:
+            return
+        self.changes += 1
+        self.hold_until = now + BANDWIDTH_HOLD
+    
+    def summary(self):
+        """Describe the current level and the average output rate."""
+        scale, depth, threshold = self.ladder[self.level]
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        kbps = self.total_bytes * 8 / 1000 / elapsed if elapsed > 0 else 0.0
+        return (f"Bandwidth: {kbps:.0f} kbit/s average, {self.changes} level changes, "
+                f"ended at level {self.level} (scale {scale:g}, {depth} colour, repaint threshold {threshold:.2f})")
+
+class PipelinedPlayer:
+    """
+    Play a video with decoding, conversion and terminal output on separate threads.
+    
+    The stages are linked by bounded queues, so a slow stage applies back-pressure
+    instead of buffering without limit. cv2 and NumPy release the GIL while they
+    work, which lets decode, conversion and writes overlap on a multi-core machine.
+    """
+    
+    # Marks the end of the stream as it passes through the queues.
+    _END = object()
+    
+    def __init__(self, cap, convert, out, clock, frame_delay, queue_depth=DEFAULT_QUEUE_DEPTH, bandwidth=None,
+                 scene_cuts=None):
+        """
+        Args:
+            cap: An opened cv2.VideoCapture.
+            convert: Callable turning a BGR frame into the bytes to write.
+            out: Binary stream to write frames to.
+            clock (PlaybackClock): Schedules output and decides which frames to drop.
+            frame_delay (float): Nominal seconds per frame, used when the source has no timestamps.
+            queue_depth (int): Frames buffered between each pair of stages.
+            bandwidth (BandwidthController): Adapts the output to the link (optional).
+            scene_cuts (SceneCutDetector): The detector used by convert; cut timestamps are added to its times.
+        """
+        self.cap = cap
+        self.convert = convert
+        self.out = out
+        self.clock = clock
+        self.frame_delay = frame_delay
+        self.bandwidth = bandwidth
+        self.scene_cuts = scene_cuts
+        self.frames = queue.Queue(maxsize=queue_depth)
+        self.encoded = queue.Queue(maxsize=queue_depth)
+        self.stop_event = threading.Event()
+        self.errors = []
+    
+    def run(self):
+        """Play until the video ends or stop() is called, re-raising any stage error."""
+        threads = [
+            threading.Thread(target=self._guard, args=(self._decode_loop,), name="avp-decode", daemon=True),
+            threading.Thread(target=self._guard, args=(self._convert_loop,), name="avp-convert", daemon=True),
+            threading.Thread(target=self._guard, args=(self._output_loop,), name="avp-output", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                # Join with a timeout so KeyboardInterrupt still reaches the main thread.
+                while thread.is_alive():
+                    thread.join(0.1)
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+        if self.errors:
+            raise self.errors[0]
+    
+    def stop(self):
+        """Ask every stage to finish."""
+        self.stop_event.set()
+    
+    def _guard(self, loop):
+        try:
+            loop()
+        except Exception as e:
+            self.errors.append(e)
+            self.stop()
+    
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return self._END
+    
+    def _decode_loop(self):
+        import cv2
+        
+        index = 0
+        while not self.stop_event.is_set():
+            # grab() only demuxes; frames that are already late are never decoded into BGR.
+            if not self.cap.grab():
+                break
+            pts = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if pts <= 0 and index > 0:
+                pts = index * self.frame_delay
+            index += 1
+            if self.clock.is_behind(pts):
+                self.clock.drop()
+                continue
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                break
+            if not self._put(self.frames, (pts, frame)):
+                return
+        self._put(self.frames, self._END)
+    
+    def _convert_loop(self):
+        while True:
+            item = self._get(self.frames)
+            if item is self._END:
+                break
+            pts, frame = item
+            if self.bandwidth is not None:
+                self.bandwidth.apply()
+            data = self.convert(frame)
+            if self.scene_cuts is not None and self.scene_cuts.cut:
+                self.scene_cuts.times.append(pts)
+            if not self._put(self.encoded, (pts, data)):
+                return
+        self._put(self.encoded, self._END)
+    
+    def _output_loop(self):
+        while True:
+            item = self._get(self.encoded)
+            if item is self._END:
+                break
+            pts, data = item
+            self.clock.wait(pts)
+            started = time.perf_counter()
+            self.out.write(data)
+            self.out.flush()
+            if self.bandwidth is not None:
+                self.bandwidth.record(len(data), time.perf_counter() - started)
+            self.clock.presented(pts)
+
+def is_keyframe(data):
+    """Return True if encoded output from DeltaRenderer is a full repaint rather than a delta."""
+    return data.startswith(CURSOR_HOME) or data.startswith(CLEAR_SCREEN_CODE)
+
+class BroadcastClient:
+    """
+    One viewer of a FrameBroadcaster: a socket fed from a bounded queue by its own thread.
+    
+    The queue holds encoded frames. While waiting_key is set the client has missed
+    output (it just joined or fell behind) and only a keyframe can bring its
+    screen back in sync, so delta frames are not queued for it.
+    """
+    
+    # Ends the sender thread.
+    _CLOSE = object()
+    
+    def __init__(self, sock, address, queue_depth=CLIENT_QUEUE_DEPTH):
+        self.sock = sock
+        self.address = address
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.waiting_key = True
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        # The viewer's screen holds whatever was there before; clear it ahead of the first keyframe.
+        self.queue.put(CLEAR_SCREEN_CODE + HIDE_CURSOR)
+        self.thread = threading.Thread(target=self._send_loop, name=f"avp-client-{address[1]}", daemon=True)
+        self.thread.start()
+    
+    def offer(self, data, key):
+        """
+        Queue a frame without blocking.
+        
+        Returns:
+            bool: False if the client cannot take the frame and needs a keyframe to resync.
+        """
+        if self.closed:
+            return True
+        if self.waiting_key and not key:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            # Too far behind: forget the backlog and pick up again at the next keyframe.
+            self._drain()
+            self.dropped += 1
+            self.waiting_key = True
+            return False
+        self.waiting_key = False
+        return True
+    
+    def close(self):
+        """Send what is queued, then close the connection."""
+        if not self.closed:
+            try:
+                self.queue.put(self._CLOSE, timeout=1.0)
+            except queue.Full:
+                self._drain()
+                self.queue.put(self._CLOSE)
+        self.thread.join(timeout=2.0)
+    
+    def _drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+    
+    def _send_loop(self):
+        try:
+            while True:
+                data = self.queue.get()
+                if data is self._CLOSE:
+                    break
+                self.sock.sendall(data)
+                self.sent += 1
+        except OSError:
+            pass
+        finally:
+            self.closed = True
+            self.sock.close()
+
+class FrameBroadcaster:
+    """
+    Serve encoded frames to any number of TCP viewers, e.g. telnet or nc.
+    
+    Frames are rendered once and written here in place of a terminal (write() and
+    flush() mirror a binary stream). Each client gets its own bounded queue and
+    sender thread, so a slow connection only ever drops its own frames. Clients
+    that join or fall behind wait for a keyframe, and until one arrives every
+    write asks the renderer for a full repaint through request_keyframe.
+    """
+    
+    def __init__(self, host, port, request_keyframe=None, queue_depth=CLIENT_QUEUE_DEPTH):
+        """
+        Args:
+            host (str): Address to listen on.
+            port (int): TCP port to listen on; 0 picks a free one.
+            request_keyframe: Callable asking for the next frame to be a full repaint (optional).
+            queue_depth (int): Frames buffered per client.
+        """
+        self.request_keyframe = request_keyframe
+        self.queue_depth = queue_depth
+        self.clients = []
+        self.lock = threading.Lock()
+        self.served = 0
+        self.dropped = 0
+        self.stop_event = threading.Event()
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.2)
+        self.address = self.server.getsockname()[:2]
+        self.thread = threading.Thread(target=self._accept_loop, name="avp-accept", daemon=True)
+        self.thread.start()
+    
+    def write(self, data):
+        """Offer one frame to every client."""
+        if not data:
+            return
+        key = is_keyframe(data)
+        resync = False
+        with self.lock:
+            self.dropped += sum(client.dropped for client in self.clients if client.closed)
+            self.clients = [client for client in self.clients if not client.closed]
+            for client in self.clients:
+                if not client.offer(data, key):
+                    resync = True
+        if resync and self.request_keyframe is not None:
+            self.request_keyframe()
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        """Stop accepting, flush every client's queue and disconnect them."""
+        self.stop_event.set()
+        self.thread.join()
+        self.server.close()
+        with self.lock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            client.close()
+            self.dropped += client.dropped
+    
+    def summary(self):
+        """Describe the clients served and the frames slow clients missed."""
+        return (f"Served {self.served} clients on {self.address[0]}:{self.address[1]}, "
+                f"{self.dropped} frames dropped for slow clients.")
+    
+    def _accept_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                sock, address = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.clients.append(BroadcastClient(sock, address, self.queue_depth))
+                self.served += 1
+            if self.request_keyframe is not None:
+                self.request_keyframe()
+
+class FrameFileWriter:
+    """
+    Write encoded terminal frames to a pre-rendered frame file.
+    
+    The file starts with a fixed header (grid size, fps, frame count, index
+    position) followed by a JSON metadata block and the frame payloads, and ends
+    with an index holding the offset, length and flags of every frame. The header
+    is rewritten by close() once the frame count and index position are known.
+    """
+    
+    def __init__(self, path, fps, metadata=None, compress=False):
+        """
+        Args:
+            path (str): File to create.
+            fps (float): Frame rate the frames were rendered at.
+            metadata (dict): Render settings to store with the frames (optional).
+            compress (bool): zlib-compress payloads where that makes them smaller.
+        """
+        self.file = open(path, "wb")
+        self.fps = fps
+        self.compress = compress
+        self.columns = 0
+        self.rows = 0
+        self.index = []
+        self.metadata = json.dumps(metadata or {}).encode("utf-8")
+        self.bytes_written = 0
+        self._write_header(0)
+        self.file.write(self.metadata)
+    
+    def write(self, data, key=False, cut=False):
+        """Append one encoded frame; key marks frames that repaint the whole grid, cut those that start a scene."""
+        flags = (FRAME_KEY if key else 0) | (FRAME_CUT if cut else 0)
+        if self.compress and data:
+            packed = zlib.compress(data)
+            if len(packed) < len(data):
+                data = packed
+                flags |= FRAME_ZLIB
+        self.index.append((self.file.tell(), len(data), flags))
+        self.file.write(data)
+    
+    def cut_times(self):
+        """Return the timestamps in seconds of the scene cuts written so far."""
+        return cut_times((flags for _, _, flags in self.index), self.fps)
+    
+    def close(self):
+        """Write the frame index and the final header, then close the file."""
+        index_offset = self.file.tell()
+        for entry in self.index:
+            self.file.write(FRAME_INDEX_ENTRY.pack(*entry))
+        self.bytes_written = self.file.tell()
+        self.file.seek(0)
+        self._write_header(index_offset)
+        self.file.close()
+    
+    def _write_header(self, index_offset):
+        self.file.write(FRAME_FILE_HEADER.pack(FRAME_FILE_MAGIC, FRAME_FILE_VERSION, self.columns, self.rows,
+                                               self.fps, len(self.index), index_offset, len(self.metadata)))
+
+class FrameFileReader:
+    """Memory-mapped reader for files written by FrameFileWriter."""
+    
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Pre-rendered frame file.
+        
+        Raises:
+            ValueError: If the file is not a frame file this version can read.
+        """
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < FRAME_FILE_HEADER.size:
+            raise ValueError(f"'{path}' is not an ASCII frame file.")
+        (magic, version, self.columns, self.rows, self.fps, frame_count,
+         index_offset, metadata_length) = FRAME_FILE_HEADER.unpack_from(self.map)
+        if magic != FRAME_FILE_MAGIC:
+            raise ValueError(f"'{path}' is not an ASCII frame file.")
+        if version != FRAME_FILE_VERSION:
+            raise ValueError(f"'{path}' has unsupported frame file version {version}.")
+        metadata_start = FRAME_FILE_HEADER.size
+        self.metadata = json.loads(self.map[metadata_start:metadata_start + metadata_length] or b"{}")
+        self.frame_count = frame_count
+        self.index_offset = index_offset
+    
+    def __len__(self):
+        return self.frame_count
+    
+    def entry(self, number):
+        """Return the (offset, length, flags) index entry of a frame."""
+        return FRAME_INDEX_ENTRY.unpack_from(self.map, self.index_offset + number * FRAME_INDEX_ENTRY.size)
+    
+    def frame(self, number):
+        """Return the terminal bytes of a frame."""
+        offset, length, flags = self.entry(number)
+        data = memoryview(self.map)[offset:offset + length]
+        if flags & FRAME_ZLIB:
+            return zlib.decompress(data)
+        return data
+    
+    def keyframe_before(self, number):
+        """
+        Find the keyframe a frame can be reconstructed from.
+        
+        Keyframes are written at least every keyframe interval, so this walks back
+        a bounded number of index entries however long the file is.
+        
+        Args:
+            number (int): Target frame number.
+        
+        Returns:
+            int: The number of the last keyframe at or before the target.
+        """
+        while number > 0 and not self.entry(number)[2] & FRAME_KEY:
+            number -= 1
+        return number
+    
+    def cut_times(self):
+        """Return the timestamps in seconds of the scene cuts recorded in the file."""
+        return cut_times((self.entry(number)[2] for number in range(self.frame_count)), self.fps)
+    
+    def close(self):
+        self.map.close()
+
+def render_to_file(cap, convert, renderer, path, metadata=None, compress=False,
+                   keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, scene_cuts=None):
+    """
+    Convert every frame of a capture and store the encoded output in a frame file.
+    
+    A full repaint is forced at least every keyframe_interval seconds; frames the
+    renderer repaints on its own, such as scene cuts, also count as keyframes.
+    Frames the scene_cuts detector flagged are marked as cuts in the index.
+    
+    Args:
+        cap: An opened cv2.VideoCapture.
+        convert: Callable turning a BGR frame into the bytes to write.
+        renderer (DeltaRenderer): The renderer used by convert, to tell keyframes apart.
+        path (str): File to create.
+        metadata (dict): Render settings to store with the frames (optional).
+        compress (bool): zlib-compress frame payloads.
+        keyframe_interval (float): Longest stretch of delta frames, in seconds.
+        scene_cuts (SceneCutDetector): The detector used by convert, if any.
+    
+    Returns:
+        FrameFileWriter: The closed writer, for its frame and byte counts.
+    """
+    import cv2
+    
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    max_deltas = max(1, int(round(keyframe_interval * fps)))
+    metadata = dict(metadata or {}, keyframe_interval=keyframe_interval)
+    writer = FrameFileWriter(path, fps, metadata=metadata, compress=compress)
+    since_key = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if since_key >= max_deltas:
+                renderer.request_repaint()
+            data = convert(frame)
+            writer.rows, writer.columns = renderer.shape
+            writer.write(data, key=renderer.last_was_full, cut=scene_cuts is not None and scene_cuts.cut)
+            since_key = 0 if renderer.last_was_full else since_key + 1
+    finally:
+        writer.close()
+    return writer
+
+def make_render_stages(settings, workers=1, prescaled=False):
+    """
+    Build the FrameConverter and DeltaRenderer for a dict of render settings.
+    
+    Args:
+        settings (dict): gradient, gamma, mode, dither, chroma, color_depth, color_bits,
+            repaint_threshold, max_width, max_height, columns and scene_cut_threshold.
+        workers (int): Band worker threads for the renderer.
+        prescaled (bool): Frames already arrive at the pixel grid.
+    
+    Returns:
+        tuple: (converter, renderer)
+    """
+    lut = gradient_lut(settings["gamma"], settings["gradient"])
+    scene_cuts = None
+    if settings.get("scene_cut_threshold"):
+        scene_cuts = SceneCutDetector(settings["scene_cut_threshold"])
+    converter = FrameConverter(lut, max_width=settings["max_width"], max_height=settings["max_height"],
+                               columns=settings.get("columns"),
+                               mode=settings["mode"], prescaled=prescaled, gamma=settings["gamma"],
+                               dither=settings["dither"], chroma=settings["chroma"], scene_cuts=scene_cuts)
+    renderer = DeltaRenderer(mode_glyphs(settings["mode"], settings["gradient"]),
+                             palette=make_palette(settings["color_depth"], settings["color_bits"]),
+                             repaint_threshold=settings["repaint_threshold"], dither=settings["dither"],
+                             workers=workers, chroma=settings["chroma"])
+    return converter, renderer
+
+def make_convert(converter, renderer):
+    """Return the callable turning a BGR frame into output bytes, repainting fully on scene cuts."""
+    
+    def convert(frame):
+        converted = converter.convert(frame)
+        if converter.cut:
+            renderer.request_repaint()
+        return renderer.render(*converted)
+    
+    return convert
+
+def transcode_worker(shm_name, ring_shape, settings, jobs, results):
+    """
+    Worker process of render_to_file_parallel(): encode runs of frames from the shared ring.
+    
+    Each job is (number, first_slot, count). The worker converts those slots in
+    place, starting with a full repaint, and puts (number, [(data, key, cut), ...])
+    on results. A None job ends the worker.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=shm.buf)
+    converter, renderer = make_render_stages(settings, prescaled=True)
+    convert = make_convert(converter, renderer)
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            number, first, count = job
+            if number == 0:
+                renderer.reset()
+            else:
+                renderer.request_repaint()
+            # The previous frame this worker saw belongs to another run.
+            if converter.scene_cuts is not None:
+                converter.scene_cuts.reset()
+            encoded = []
+            for slot in range(first, first + count):
+                data = convert(ring[slot])
+                encoded.append((data, renderer.last_was_full, converter.cut))
+            results.put((number, encoded))
+    except Exception as e:
+        results.put((None, e))
+    finally:
+        del ring
+        shm.close()
+
+def render_to_file_parallel(cap, path, settings, processes, metadata=None, compress=False,
+                            keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, prescaled=False):
+    """
+    Like render_to_file(), but encode independent runs of frames in worker processes.
+    
+    Every keyframe starts a run that depends on no earlier frame, so the video is
+    cut into runs of one keyframe interval and each run is encoded by whichever
+    worker is free. The decoder resizes frames straight into a ring of slots in
+    shared memory, sized for one run per worker plus the one being decoded; the
+    workers read the slots in place and only the encoded bytes travel back. The
+    runs are written in order as they complete.
+    
+    Args:
+        cap: An opened capture.
+        path (str): File to create.
+        settings (dict): Render settings, see make_render_stages().
+        processes (int): Number of worker processes.
+        metadata (dict): Render settings to store with the frames (optional).
+        compress (bool): zlib-compress frame payloads.
+        keyframe_interval (float): Length of each run, in seconds.
+        prescaled (bool): The capture already delivers frames at the pixel grid.
+    
+    Returns:
+        FrameFileWriter: The closed writer, for its frame and byte counts.
+    """
+    import cv2
+    
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    run_length = max(1, int(round(keyframe_interval * fps))) + 1
+    metadata = dict(metadata or {}, keyframe_interval=keyframe_interval)
+    writer = FrameFileWriter(path, fps, metadata=metadata, compress=compress)
+    ret, frame = cap.read()
+    if not ret:
+        writer.close()
+        return writer
+    height, width = frame.shape[:2]
+    cell_width, cell_height = MODE_CELL_PIXELS[settings["mode"]]
+    if prescaled:
+        grid = width // cell_width, height // cell_height
+    else:
+        columns, rows = cell_grid(height, width, output_columns(settings["max_width"]),
+                                  output_rows(settings["max_height"]))
+        grid = columns, max(rows, 1)
+    pixels = pixel_grid(grid, settings["mode"])
+    writer.columns, writer.rows = grid
+    
+    groups = processes + 1
+    ring_shape = (groups * run_length, pixels[1], pixels[0], 3)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(ring_shape)))
+    ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=shm.buf)
+    jobs = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=transcode_worker, args=(shm.name, ring_shape, settings, jobs, results),
+                                       name=f"avp-transcode-{i}", daemon=True)
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    free_groups = list(range(groups))
+    busy = {}
+    finished = {}
+    next_run = 0
+    
+    def collect():
+        nonlocal next_run
+        while True:
+            try:
+                number, encoded = results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if any(not worker.is_alive() for worker in workers):
+                    raise RuntimeError("a transcode worker exited unexpectedly")
+        if number is None:
+            raise encoded
+        finished[number] = encoded
+        free_groups.append(busy.pop(number))
+        while next_run in finished:
+            for data, key, cut in finished.pop(next_run):
+                writer.write(data, key=key, cut=cut)
+            next_run += 1
+    
+    try:
+        number = 0
+        while frame is not None:
+            if not free_groups:
+                collect()
+                continue
+            group = free_groups.pop()
+            first = group * run_length
+            count = 0
+            while count < run_length and frame is not None:
+                if frame.shape[:2] == (pixels[1], pixels[0]):
+                    np.copyto(ring[first + count], frame)
+                else:
+                    cv2.resize(frame, pixels, dst=ring[first + count])
+                count += 1
+                ret, frame = cap.read()
+                if not ret:
+                    frame = None
+            busy[number] = group
+            jobs.put((number, first, count))
+            number += 1
+        while busy:
+            collect()
+    finally:
+        for worker in workers:
+            jobs.put(None)
+        for worker in workers:
+            worker.join(timeout=5.0)
+            if worker.is_alive():
+                worker.terminate()
+        del ring
+        shm.close()
+        shm.unlink()
+        writer.close()
+    return writer
+
+def parse_positive_int(text):
+    """Parse an option that must be a whole number of at least 1."""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid positive integer '{text}'")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"invalid positive integer '{text}'")
+    return value
+
+def parse_timestamp(text):
+    """
+    Parse a timestamp given as seconds, MM:SS or HH:MM:SS (fractions allowed).
     
-    Args:
-        brightness (int): Pixel brightness (0-255).
-        gamma (float): Gamma correction factor; values < 1.0 boost mid-tones.
-        gradient (str): A string of ASCII characters ordered from darkest to lightest.
-        
     Returns:
-        str: Corresponding ASCII character.
+        float: The timestamp in seconds.
     """
-    normalized = brightness / 255.0
-    adjusted = normalized ** gamma
-    index = int(adjusted * (len(gradient) - 1))
-    return gradient[index]
+    seconds = 0.0
+    try:
+        for part in text.split(":"):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid timestamp '{text}'")
+    if seconds < 0 or text.count(":") > 2:
+        raise argparse.ArgumentTypeError(f"invalid timestamp '{text}'")
+    return seconds
 
-def get_terminal_size():
-    """Get the terminal window size."""
-    columns, rows = shutil.get_terminal_size()
-    return columns, rows
+def format_cuts(times):
+    """Describe scene cut timestamps for the user."""
+    return "Scene cuts at: " + ", ".join(f"{int(t // 60)}:{t % 60:05.2f}" for t in times)
+
+def parse_chroma(text):
+    """
+    Parse a --chroma-subsample value: N for N columns, or NxM for N columns by M rows.
+    
+    Returns:
+        tuple: (columns, rows) of cells that share one colour.
+    """
+    try:
+        factors = tuple(int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid chroma subsampling '{text}'")
+    if len(factors) == 1:
+        factors += (1,)
+    if len(factors) != 2 or min(factors) < 1:
+        raise argparse.ArgumentTypeError(f"invalid chroma subsampling '{text}'")
+    return factors
+
+def parse_bandwidth(text):
+    """
+    Parse a --max-kbps value.
+    
+    Returns:
+        float: The budget in kilobits per second, or 0.0 for 'auto'.
+    """
+    if text == "auto":
+        return 0.0
+    try:
+        kbps = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid bandwidth '{text}'")
+    if kbps <= 0:
+        raise argparse.ArgumentTypeError(f"invalid bandwidth '{text}'")
+    return kbps
 
-def frame_to_ascii_color(frame, gamma=0.5, gradient=DEFAULT_ASCII_GRADIENT, max_width=None, max_height=None):
+def play_frame_file(path, out, clock, start=None, end=None):
     """
-    Convert an image frame to colored ASCII art with gamma correction.
+    Stream a pre-rendered frame file to the terminal at its recorded frame rate.
+    
+    To start part-way through, playback seeks to the keyframe before the start
+    and writes the few delta frames up to the start without waiting. Only the
+    standard library is needed here; the frames are already encoded.
     
     Args:
-        frame: Image frame (BGR as read by OpenCV).
-        gamma (float): Gamma correction factor.
-        gradient (str): A string of ASCII characters for brightness mapping.
+        path (str): Pre-rendered frame file.
+        out: Binary stream to write frames to.
+        clock (PlaybackClock): Schedules output and counts late frames.
+        start (float): Timestamp to start at, in seconds (optional).
+        end (float): Timestamp to stop at, in seconds (optional).
+    """
+    reader = FrameFileReader(path)
+    try:
+        frame_delay = 1.0 / reader.fps if reader.fps > 0 else 0.033
+        first = min(int(round((start or 0) * reader.fps)), len(reader))
+        last = len(reader) if end is None else min(int(round(end * reader.fps)), len(reader))
+        clock.restart(late_tolerance=frame_delay)
+        out.write(CLEAR_SCREEN_CODE)
+        for number in range(reader.keyframe_before(first) if first < last else first, first):
+            out.write(reader.frame(number))
+        for number in range(first, last):
+            pts = (number - first) * frame_delay
+            clock.wait(pts)
+            out.write(reader.frame(number))
+            out.flush()
+            clock.presented(pts)
+    finally:
+        reader.close()
+
+class FFmpegCapture:
+    """
+    Decode a video with an ffmpeg subprocess that scales frames to the cell grid.
+    
+    ffmpeg resizes while decoding and writes raw BGR frames to a pipe, so the
+    player never handles full-resolution pixels. Frames are read straight into a
+    small ring of preallocated NumPy buffers; ring_size must exceed the number of
+    frames the caller can hold at once. The methods used by the player mirror
+    cv2.VideoCapture.
+    """
+    
+    def __init__(self, source, max_width=None, max_height=None, ring_size=DEFAULT_QUEUE_DEPTH + 2,
+                 mode="glyph", columns=None):
+        """
+        Args:
+            source (str): Video file path or direct stream URL.
+            max_width (int): Maximum width for the ASCII output (optional).
+            max_height (int): Maximum height for the ASCII output (optional).
+            ring_size (int): Number of frame buffers to rotate through.
+            mode (str): One of RENDER_MODES; sets how many pixels each cell covers.
+            columns (int): Fixed number of columns instead of following the terminal (optional).
+        """
+        self.proc = None
+        self.fps = 0.0
+        self.frame_number = 0
+        self.current = None
+        probe = self._probe(source)
+        if probe is None:
+            return
+        width, height, self.fps = probe
+        if columns:
+            columns, rows = cell_grid(height, width, columns, max_height)
+        else:
+            columns, rows = cell_grid(height, width, output_columns(max_width), output_rows(max_height))
+        columns, rows = pixel_grid((columns, max(rows, 1)), mode)
+        self.ring = [np.empty((rows, columns, 3), dtype=np.uint8) for _ in range(ring_size)]
+        self.ring_position = 0
+        try:
+            self.proc = subprocess.Popen(
+                ["ffmpeg", "-v", "error", "-nostdin", "-i", source, "-an", "-sn",
+                 "-vf", f"scale={columns}:{rows}:flags=area", "-f", "rawvideo", "-pix_fmt", "bgr24", "-"],
+                stdout=subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            self.proc = None
+    
+    @staticmethod
+    def _probe(source):
+        try:
+            result = subprocess.run(
+                ["ffprobe", "-v", "error", "-select_streams", "v:0",
+                 "-show_entries", "stream=width,height,avg_frame_rate,r_frame_rate", "-of", "json", source],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True,
+            )
+            stream = json.loads(result.stdout)["streams"][0]
+        except (FileNotFoundError, subprocess.CalledProcessError, ValueError, KeyError, IndexError):
+            return None
+        fps = 0.0
+        for rate in (stream.get("avg_frame_rate"), stream.get("r_frame_rate")):
+            numerator, _, denominator = (rate or "0/0").partition("/")
+            if float(denominator or 0) > 0 and float(numerator) > 0:
+                fps = float(numerator) / float(denominator)
+                break
+        return int(stream["width"]), int(stream["height"]), fps
+    
+    def isOpened(self):
+        return self.proc is not None
+    
+    def grab(self):
+        """Read the next frame from the pipe into the next ring buffer."""
+        if self.proc is None:
+            return False
+        buffer = self.ring[self.ring_position]
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < len(view):
+            count = self.proc.stdout.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        self.ring_position = (self.ring_position + 1) % len(self.ring)
+        self.current = buffer
+        self.frame_number += 1
+        return True
+    
+    def retrieve(self):
+        return self.current is not None, self.current
+    
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+    
+    def get(self, prop):
+        import cv2
+        
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return (self.frame_number - 1) * 1000.0 / self.fps if self.fps > 0 else 0.0
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.frame_number)
+        return 0.0
+    
+    def release(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.stdout.close()
+            self.proc.wait()
+            self.proc = None
+
+def open_video(source, decoder="cv2", max_width=None, max_height=None, queue_depth=DEFAULT_QUEUE_DEPTH,
+               mode="glyph", columns=None):
+    """
+    Open a local file or direct stream URL with the selected decoder backend.
+    
+    Args:
+        source (str): Video file path or direct stream URL.
+        decoder (str): 'cv2' for cv2.VideoCapture or 'ffmpeg' for FFmpegCapture.
         max_width (int): Maximum width for the ASCII output (optional).
         max_height (int): Maximum height for the ASCII output (optional).
+        queue_depth (int): Frames buffered between pipeline stages.
+        mode (str): One of RENDER_MODES.
+        columns (int): Fixed number of columns instead of following the terminal (optional).
     
     Returns:
-        str: The ASCII art with ANSI color escape sequences.
+        A capture object; check isOpened() before use.
     """
-    # Convert frame from BGR to RGB.
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    height, width, _ = frame_rgb.shape
-    aspect_ratio = height / width
+    if decoder == "ffmpeg":
+        # Queued frames, plus one being converted and one being read.
+        return FFmpegCapture(source, max_width=max_width, max_height=max_height, ring_size=queue_depth + 2,
+                             mode=mode, columns=columns)
+    import cv2
+    
+    return cv2.VideoCapture(source)
 
-    # Get terminal dimensions.
-    term_width, term_height = get_terminal_size()
-    # Determine new width based on terminal width and optional max_width.
-    new_width = min(term_width, max_width) if max_width else term_width
-    # Calculate new height from aspect ratio and scale factor (0.55 approximates terminal character aspect ratio).
-    new_height = int(aspect_ratio * new_width * 0.55)
-    if max_height:
-        new_height = min(new_height, max_height)
+def select_format(info, columns, max_height=None, mode="glyph"):
+    """
+    Pick the cheapest stream from yt-dlp metadata that still covers the cell grid.
+    
+    Video-only formats are preferred, since the player never uses audio. Among
+    them the smallest one whose frames are at least as large as the grid is
+    chosen; if none is large enough, the largest available one is used.
+    
+    Args:
+        info (dict): Metadata as returned by yt-dlp (-J / extract_info()).
+        columns (int): Number of columns to draw.
+        max_height (int): Maximum number of rows (optional).
+        mode (str): One of RENDER_MODES.
+    
+    Returns:
+        dict: The selected format, or None if the metadata lists no usable formats.
+    """
+    playable = [
+        f for f in info.get("formats") or []
+        if f.get("url") and f.get("width") and f.get("height")
+        and f.get("vcodec") not in (None, "none")
+        and f.get("protocol", "https") in STREAM_PROTOCOLS
+    ]
+    video_only = [f for f in playable if f.get("acodec") == "none"]
+    candidates = video_only or playable
+    if not candidates:
+        return None
+
+    def cost(f):
+        return f["width"] * f["height"], f.get("tbr") or 0
+
+    covering = []
+    for f in candidates:
+        grid_width, grid_height = pixel_grid(cell_grid(f["height"], f["width"], columns, max_height), mode)
+        if f["width"] >= grid_width and f["height"] >= grid_height:
+            covering.append(f)
+    if covering:
+        return min(covering, key=cost)
+    return max(candidates, key=cost)
+
+def url_expiry(url, default_ttl=DEFAULT_CACHE_TTL):
+    """Return the expiry time embedded in a stream URL, or now + default_ttl if there is none."""
+    match = URL_EXPIRE_PATTERN.search(url)
+    if match:
+        return int(match.group(1))
+    return int(time.time()) + default_ttl
+
+class StreamCache:
+    """
+    Persistent cache of resolved stream URLs and their metadata.
+    
+    Entries are keyed by source URL and format choice, expire when the stream
+    URL does, and the least recently used entries are evicted once the cache
+    holds more than max_entries.
+    """
+    
+    def __init__(self, path=STREAM_CACHE_PATH, max_entries=DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.entries = self._load()
+    
+    def get(self, key):
+        """
+        Look up a resolved stream.
+        
+        Args:
+            key (str): Cache key (see stream_cache_key()).
+        
+        Returns:
+            dict: The entry with url, fps, width, height and expires, or None.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry["expires"] - CACHE_EXPIRY_MARGIN < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["last_used"] = time.time()
+        self._save()
+        return entry
     
-    resized_rgb = cv2.resize(frame_rgb, (new_width, new_height))
-    gray = cv2.cvtColor(resized_rgb, cv2.COLOR_RGB2GRAY)
+    def put(self, key, url, fps=None, width=None, height=None):
+        """Store a resolved stream, evicting the least recently used entries over the size cap."""
+        now = time.time()
+        self.entries = {k: e for k, e in self.entries.items() if e["expires"] > now}
+        self.entries[key] = {
+            "url": url,
+            "fps": fps,
+            "width": width,
+            "height": height,
+            "expires": url_expiry(url),
+            "last_used": now,
+        }
+        if len(self.entries) > self.max_entries:
+            by_age = sorted(self.entries, key=lambda k: self.entries[k]["last_used"])
+            for stale in by_age[:len(self.entries) - self.max_entries]:
+                del self.entries[stale]
+        self._save()
     
-    ascii_art = ''
-    for y in range(new_height):
-        for x in range(new_width):
-            r, g, b = resized_rgb[y, x]
-            brightness = gray[y, x]
-            char = pixel_to_ascii(brightness, gamma=gamma, gradient=gradient)
-            # Use ANSI escape codes for 24-bit color.
-            ascii_art += f'\033[38;2;{r};{g};{b}m{char}\033[0m'
-        ascii_art += "\n"
-    return ascii_art
+    def summary(self):
+        """Return a one-line report of the hit and miss counts."""
+        return f"Stream cache: {self.hits} hits, {self.misses} misses ({self.path})."
+    
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # The cache is an optimisation only; playback goes on without it.
+            pass
+
+class ResolveError(Exception):
+    """Raised when yt-dlp cannot resolve a source."""
+
+# Shared in-process extractors, keyed by whether they list playlists flat; created on
+# first use so local files never import yt_dlp.
+_ydl_instances = {}
+_ydl_lock = threading.Lock()
+
+def extract_info_cli(source, flat=False):
+    """Fetch yt-dlp metadata for a source by running the yt-dlp command."""
+    command = ["yt-dlp", "-J", "--flat-playlist" if flat else "--no-playlist", source]
+    try:
+        result = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+    except FileNotFoundError:
+        raise ResolveError("yt-dlp is not installed.")
+    except subprocess.CalledProcessError as e:
+        raise ResolveError(e.stderr.strip())
+    return json.loads(result.stdout)
+
+def extract_info(source, flat=False):
+    """
+    Fetch yt-dlp metadata for a source.
+    
+    The yt_dlp module is imported on first use and YoutubeDL instances are
+    reused, so extractors are loaded once per session rather than once per URL.
+    When the module is not installed the yt-dlp command is used instead.
+    
+    Args:
+        source (str): Video or playlist URL.
+        flat (bool): List playlist entries without resolving each one.
+    
+    Returns:
+        dict: The metadata, in the same form as yt-dlp -J prints it.
+    """
+    with _ydl_lock:
+        ydl = _ydl_instances.get(flat)
+        if ydl is None:
+            try:
+                import yt_dlp
+            except ImportError:
+                return extract_info_cli(source, flat=flat)
+            options = dict(YDL_OPTIONS, extract_flat="in_playlist", noplaylist=False) if flat else YDL_OPTIONS
+            ydl = _ydl_instances[flat] = yt_dlp.YoutubeDL(options)
+        try:
+            info = ydl.extract_info(source, download=False)
+        except Exception as e:
+            # yt-dlp reports its own failures as DownloadError or ExtractorError.
+            raise ResolveError(str(e))
+        return ydl.sanitize_info(info)
+
+def extract_playlist_id(source):
+    """Return the playlist ID of a YouTube URL, or None if it is not a playlist."""
+    query_params = urllib.parse.parse_qs(urllib.parse.urlparse(source).query)
+    return query_params.get("list", [None])[0]
+
+def get_playlist_videos(source):
+    """
+    List the video URLs of a playlist.
+    
+    Args:
+        source (str): Playlist URL.
+    
+    Returns:
+        list: Video URLs in playlist order.
+    """
+    info = extract_info(source, flat=True)
+    videos = []
+    for entry in info.get("entries") or []:
+        if entry.get("url"):
+            videos.append(entry["url"])
+        elif entry.get("id"):
+            videos.append(f"https://www.youtube.com/watch?v={entry['id']}")
+    return videos
+
+def stream_cache_key(source, columns, max_height=None, mode="glyph"):
+    """Build the cache key for a source and the format choice made for it."""
+    key = f"{source}|{columns}x{max_height or ''}"
+    if mode != "glyph":
+        key += f"|{mode}"
+    return key
 
-def clear_screen():
-    """Clear the terminal screen."""
-    os.system("cls" if os.name == "nt" else "clear")
+def resolve_stream(source, max_width=None, max_height=None, cache=None, mode="glyph"):
+    """
+    Resolve a video URL to the direct URL of the smallest stream that covers the output grid.
+    
+    Args:
+        source (str): Video URL.
+        max_width (int): Maximum width for the ASCII output (optional).
+        max_height (int): Maximum height for the ASCII output (optional).
+        cache (StreamCache): Cache of previously resolved streams (optional).
+        mode (str): One of RENDER_MODES.
+    
+    Returns:
+        str: The direct stream URL.
+    
+    Raises:
+        ResolveError: If yt-dlp fails or lists no playable stream.
+    """
+    columns, max_height = output_columns(max_width), output_rows(max_height)
+    key = stream_cache_key(source, columns, max_height, mode)
+    if cache is not None:
+        entry = cache.get(key)
+        if entry:
+            return entry["url"]
+    info = extract_info(source)
+    selected = select_format(info, columns, max_height, mode) or info
+    if not selected.get("url"):
+        raise ResolveError(f"No playable video stream found for '{source}'.")
+    if cache is not None:
+        cache.put(key, selected["url"], fps=selected.get("fps"),
+                  width=selected.get("width"), height=selected.get("height"))
+    return selected["url"]
 
-def get_video_source(source):
+def get_video_source(source, max_width=None, max_height=None, cache=None, mode="glyph"):
     """
     Determine if the provided source is a YouTube URL or a local file.
-    If it's a YouTube URL, use yt-dlp to extract the direct video stream URL.
+    If it's a YouTube URL, use yt-dlp to extract the direct URL of the smallest
+    stream that covers the output grid.
     
     Args:
         source (str): YouTube URL or local file path.
+        max_width (int): Maximum width for the ASCII output (optional).
+        max_height (int): Maximum height for the ASCII output (optional).
+        cache (StreamCache): Cache of previously resolved streams (optional).
+        mode (str): One of RENDER_MODES.
     
     Returns:
         str: The URL/path to the video stream.
@@ -107,27 +2332,429 @@ def get_video_source(source):
     parsed = urllib.parse.urlparse(source)
     if parsed.scheme in ('http', 'https'):
         try:
-            result = subprocess.run(
-                ["yt-dlp", "-g", source],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                check=True,
-            )
-            stream_url = result.stdout.splitlines()[0]
-            return stream_url
-        except subprocess.CalledProcessError as e:
+            return resolve_stream(source, max_width=max_width, max_height=max_height, cache=cache, mode=mode)
+        except ResolveError as e:
             print("Error extracting video URL with yt-dlp:")
-            print(e.stderr)
+            print(e)
             sys.exit(1)
     else:
         return source
 
-def main():
+class PlaylistPrefetcher:
+    """
+    Resolve and open upcoming playlist items on a background thread.
+    
+    While one item plays, up to depth following items are resolved with yt-dlp and
+    opened with cv2.VideoCapture, so switching to the next item does not wait for
+    extraction or for the stream to start buffering. A depth of 0 turns prefetching
+    off: each item is opened only when playback reaches it.
+    """
+    
+    def __init__(self, sources, open_source, depth=DEFAULT_PREFETCH_DEPTH):
+        """
+        Args:
+            sources (list): Playlist item URLs in order.
+            open_source: Callable returning an opened capture for a URL; any exception it raises
+                is passed on as that item's error.
+            depth (int): Number of items to keep opened ahead of playback.
+        """
+        self.sources = sources
+        self.open_source = open_source
+        self.depth = depth
+        self.ready = queue.Queue()
+        # One slot per item that may be open ahead of playback; taken before opening, freed when played.
+        self.slots = threading.Semaphore(depth)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._prefetch_loop, name="avp-prefetch", daemon=True)
+    
+    def __iter__(self):
+        """Yield (source, cap, error) for each item in order; cap is None if it could not be opened."""
+        if self.depth < 1:
+            for source in self.sources:
+                yield self._open(source)
+            return
+        self.thread.start()
+        for _ in self.sources:
+            item = self.ready.get()
+            self.slots.release()
+            yield item
+    
+    def close(self):
+        """Stop prefetching and release captures that were opened but never played."""
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+        while True:
+            try:
+                _, cap, _ = self.ready.get_nowait()
+            except queue.Empty:
+                break
+            if cap is not None:
+                cap.release()
+    
+    def _open(self, source):
+        try:
+            return source, self.open_source(source), None
+        except Exception as e:
+            # Anything else would end the thread and leave __iter__ waiting forever.
+            return source, None, e
+    
+    def _prefetch_loop(self):
+        for source in self.sources:
+            while not self.slots.acquire(timeout=0.1):
+                if self.stop_event.is_set():
+                    return
+            if self.stop_event.is_set():
+                return
+            item = self._open(source)
+            if self.stop_event.is_set():
+                if item[1] is not None:
+                    item[1].release()
+                return
+            self.ready.put(item)
+
+def open_capture(source, max_width=None, max_height=None, cache=None, decoder="cv2",
+                 queue_depth=DEFAULT_QUEUE_DEPTH, mode="glyph"):
+    """
+    Resolve a source and open it for decoding.
+    
+    Raises:
+        ResolveError: If the source cannot be resolved or opened.
+    """
+    if urllib.parse.urlparse(source).scheme in ('http', 'https'):
+        source = resolve_stream(source, max_width=max_width, max_height=max_height, cache=cache, mode=mode)
+    cap = open_video(source, decoder=decoder, max_width=max_width, max_height=max_height,
+                     queue_depth=queue_depth, mode=mode)
+    if not cap.isOpened():
+        raise ResolveError(f"Unable to open video source '{source}'")
+    return cap
+
+def play_capture(cap, convert, out, clock, queue_depth=DEFAULT_QUEUE_DEPTH, bandwidth=None, scene_cuts=None):
+    """Play an opened capture to the end through the decode/convert/output pipeline."""
+    import cv2
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_delay = 1.0 / fps if fps > 0 else 0.033
+    clock.restart(late_tolerance=frame_delay)
+    PipelinedPlayer(cap, convert, out, clock, frame_delay, queue_depth=queue_depth, bandwidth=bandwidth,
+                    scene_cuts=scene_cuts).run()
+
+def synthetic_frames(count=8, width=1280, height=720):
+    """
+    Generate a short loop of BGR test frames: a colour gradient with a moving disc.
+    
+    Returns:
+        list: count uint8 arrays of shape (height, width, 3).
+    """
+    ys, xs = np.mgrid[0:height, 0:width]
+    base = np.empty((height, width, 3), dtype=np.uint8)
+    base[:, :, 0] = xs * 255 // width
+    base[:, :, 1] = ys * 255 // height
+    base[:, :, 2] = 128
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        cx = width * (i + 1) // (count + 1)
+        disc = (xs - cx) ** 2 + (ys - height // 2) ** 2 < (height // 6) ** 2
+        frame[disc] = 255
+        frames.append(frame)
+    return frames
+
+def current_rss():
+    """Return the resident set size of this process in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def time_per_call(function, *args, repeat=200):
+    """Return the mean wall time of function(*args) in seconds."""
+    function(*args)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(*args)
+    return (time.perf_counter() - start) / repeat
+
+def chroma_frame_sizes(frames, lut, glyphs, palette, chroma, dither="none", **converter_options):
+    """
+    Return the mean (full repaint, delta) output size in bytes of a frame loop at a chroma subsampling.
+    """
+    converter = FrameConverter(lut, chroma=chroma, dither=dither, **converter_options)
+    full = DeltaRenderer(glyphs, palette=palette, dither=dither, chroma=chroma)
+    delta = DeltaRenderer(glyphs, palette=palette, dither=dither, chroma=chroma)
+    full_bytes = delta_bytes = 0
+    for frame in frames:
+        converted = converter.convert(frame)
+        full.reset()
+        full_bytes += len(full.render(*converted))
+        delta_bytes += len(delta.render(*converted))
+    return full_bytes // len(frames), delta_bytes // len(frames)
+
+def band_render_times(converter, frames, glyphs, palette, dither, workers):
+    """Return the mean (full repaint, delta) render time in seconds of a frame loop with a band worker count."""
+    converted = [tuple(array.copy() for array in converter.convert(frame)) for frame in frames]
+    renderer = DeltaRenderer(glyphs, palette=palette, dither=dither, workers=workers, chroma=converter.chroma)
+    cycle = itertools.cycle(converted)
+    
+    def full():
+        renderer.request_repaint()
+        renderer.render(*next(cycle))
+    
+    try:
+        return time_per_call(full, repeat=50), time_per_call(lambda: renderer.render(*next(cycle)), repeat=50)
+    finally:
+        renderer.close()
+
+def run_benchmark(gradient, gamma=0.5, color_depth="24bit", color_bits=DEFAULT_COLOR_BITS, dither="none",
+                  max_width=None, max_height=None, seconds=DEFAULT_BENCHMARK_SECONDS, mode="glyph", chroma=(1, 1),
+                  workers=1):
+    """
+    Measure conversion throughput and memory use on synthetic frames.
+    
+    Frames go through the same FrameConverter and DeltaRenderer as playback, with
+    no terminal output. Throughput, bytes per frame and resident memory are
+    printed BENCHMARK_SAMPLES times over the run; with reused buffers the RSS
+    column should stay flat.
+    
+    Args:
+        gradient (str): A string of ASCII characters for brightness mapping.
+        gamma (float): Gamma correction factor.
+        color_depth (str): One of COLOR_DEPTHS.
+        color_bits (int): Bits of precision per colour channel for 24-bit colour.
+        dither (str): One of DITHER_MODES.
+        max_width (int): Grid columns (default: BENCHMARK_GRID).
+        max_height (int): Maximum grid rows (default: BENCHMARK_GRID).
+        seconds (float): Length of the run.
+        mode (str): One of RENDER_MODES.
+        chroma (tuple): Chroma subsampling factors for the timed run.
+        workers (int): Band worker threads for the timed run; the scaling curve goes up to
+            this many, or to the number of CPUs when workers is 1.
+    """
+    import cv2
+    
+    # The grid must not depend on whichever terminal the benchmark runs in.
+    columns = max_width or BENCHMARK_GRID[0]
+    max_height = max_height or BENCHMARK_GRID[1]
+    frames = synthetic_frames()
+    lut = gradient_lut(gamma, gradient)
+    converter = FrameConverter(lut, max_height=max_height, columns=columns, mode=mode, gamma=gamma, dither=dither,
+                               chroma=chroma)
+    palette = make_palette(color_depth, color_bits)
+    glyphs = mode_glyphs(mode, gradient)
+    renderer = DeltaRenderer(glyphs, palette=palette, dither=dither, workers=workers, chroma=chroma)
+    print(f"Benchmark: {frames[0].shape[1]}x{frames[0].shape[0]} frames -> {columns} columns, "
+          f"{mode} mode, {seconds:g}s run")
+    
+    bgr = converter.convert(frames[0])[1]
+    cycle = itertools.cycle(frames)
+    frame_time = time_per_call(lambda: renderer.render(*converter.convert(next(cycle))))
+    print(f"Per frame at {bgr.shape[1]}x{bgr.shape[0]}: {frame_time * 1e6:.0f} us convert + render")
+    for kind in DITHER_MODES[1:]:
+        cost = time_per_call(Ditherer(kind, palette.dither_step or 1).apply, bgr)
+        print(f"  {kind} dither: {cost * 1e6:.1f} us ({cost / frame_time:.1%} of frame time)")
+    detector = SceneCutDetector()
+    if mode == "halfblock":
+        # Half-block glyphs need no brightness, so the grayscale conversion is only there for the detector.
+        pixels = itertools.cycle([converter.convert(frame) and converter.resized.copy() for frame in frames])
+        gray = converter.gray
+        
+        def detect():
+            cv2.cvtColor(next(pixels), cv2.COLOR_BGR2GRAY, dst=gray)
+            detector.update(gray)
+    else:
+        lumas = itertools.cycle([converter.convert(frame) and converter.gray.copy() for frame in frames])
+        
+        def detect():
+            detector.update(next(lumas))
+    cost = time_per_call(detect, repeat=1000)
+    print(f"  scene-cut detection: {cost * 1e6:.1f} us ({cost / frame_time:.2%} of frame time)")
+    renderer.reset()
+    if mode != "halfblock":
+        print(f"{'chroma':>8} {'full bytes':>12} {'delta bytes':>12}")
+        for factors in CHROMA_BENCHMARK_FACTORS:
+            sizes = chroma_frame_sizes(frames, lut, glyphs, palette, factors,
+                                       max_height=max_height, columns=columns, mode=mode, gamma=gamma, dither=dither)
+            print(f"{'%dx%d' % factors:>8} {sizes[0]:12d} {sizes[1]:12d}")
+    print(f"{'workers':>8} {'full us':>10} {'delta us':>10} {'speedup':>8}")
+    baseline = None
+    for count in range(1, (workers if workers > 1 else os.cpu_count() or 1) + 1):
+        times = band_render_times(converter, frames, glyphs, palette, dither, count)
+        baseline = baseline or times
+        print(f"{count:8d} {times[0] * 1e6:10.0f} {times[1] * 1e6:10.0f} {baseline[0] / times[0]:7.2f}x")
+
+    print(f"{'time':>8} {'frames':>8} {'fps':>8} {'bytes/frame':>12} {'rss MB':>8}")
+    start = time.perf_counter()
+    next_sample = start + seconds / BENCHMARK_SAMPLES
+    count = 0
+    total_bytes = 0
+    window_start, window_count, window_bytes = start, 0, 0
+    while True:
+        total_bytes += len(renderer.render(*converter.convert(frames[count % len(frames)])))
+        count += 1
+        now = time.perf_counter()
+        if now >= next_sample:
+            window_frames = count - window_count
+            print(f"{now - start:7.1f}s {count:8d} {window_frames / (now - window_start):8.1f} "
+                  f"{(total_bytes - window_bytes) // window_frames:12d} {current_rss() / 2 ** 20:8.1f}")
+            window_start, window_count, window_bytes = now, count, total_bytes
+            next_sample += seconds / BENCHMARK_SAMPLES
+            if now - start >= seconds:
+                break
+
+def batch_sources(pattern):
+    """Return the video files in a directory, or the files matching a glob, sorted."""
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)
+                 if name.lower().endswith(VIDEO_EXTENSIONS)]
+    else:
+        paths = glob.glob(pattern)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+def render_key(source, settings, keyframe_interval):
+    """
+    Build the key that decides whether a pre-rendered file is up to date.
+    
+    The key covers the source's modification time and size and every setting
+    that changes the encoded frames; it is stored in the file's metadata and
+    round-tripped through JSON so it compares equal to the stored copy.
+    """
+    stat = os.stat(source)
+    key = dict(settings, source_mtime=stat.st_mtime_ns, source_size=stat.st_size,
+               keyframe_interval=keyframe_interval, version=VERSION)
+    return json.loads(json.dumps(key))
+
+def is_up_to_date(output, key):
+    """Return True if output is a complete frame file rendered with the given key."""
+    try:
+        reader = FrameFileReader(output)
+    except (OSError, ValueError):
+        return False
+    try:
+        return reader.metadata.get("render_key") == key
+    finally:
+        reader.close()
+
+def batch_render(source, output, settings, key, decoder="cv2", compress=False,
+                 keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+    """
+    Render one file of a batch; runs in a worker process.
+    
+    The frames are written next to output, under a name unique to this process,
+    and moved into place once complete, so an interrupted job never leaves a
+    file that looks up to date.
+    
+    Returns:
+        tuple: (frames, bytes written, seconds)
+    """
+    started = time.perf_counter()
+    cap = open_video(source, decoder=decoder, max_height=settings["max_height"], mode=settings["mode"],
+                     columns=settings["columns"])
+    if not cap.isOpened():
+        raise ResolveError(f"Unable to open video source '{source}'")
+    converter, renderer = make_render_stages(settings, prescaled=decoder == "ffmpeg")
+    metadata = {"source": source, "render_key": key, "version": VERSION}
+    partial = f"{output}.{os.getpid()}{PARTIAL_SUFFIX}"
+    try:
+        writer = render_to_file(cap, make_convert(converter, renderer), renderer, partial,
+                                metadata=metadata, compress=compress, keyframe_interval=keyframe_interval,
+                                scene_cuts=converter.scene_cuts)
+        os.replace(partial, output)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        cap.release()
+    return len(writer.index), writer.bytes_written, time.perf_counter() - started
+
+def batch_main(argv):
+    """Entry point of 'batch': pre-render a directory or glob of videos into frame files."""
     parser = argparse.ArgumentParser(
-        description="Video to ASCII Converter: Render videos as colored ASCII art in your terminal."
+        prog=f"{os.path.basename(sys.argv[0])} batch",
+        description="Pre-render a directory or glob of videos into ASCII frame files for --play-file. "
+                    f"The grid is --max-width columns wide (default: {BENCHMARK_GRID[0]}), whatever the terminal size."
     )
-    parser.add_argument("source", help="Video file path or YouTube URL.")
+    parser.add_argument("pattern", help="Directory of videos, or a glob such as 'clips/*.mp4'.")
+    parser.add_argument("-o", "--output-dir", default=".",
+                        help="Directory to write the .avpf files to (default: current directory).")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Files rendered at the same time, each in its own process (default: CPU count).")
+    parser.add_argument("--force", action="store_true",
+                        help="Render every file, even when its output is up to date.")
+    add_render_arguments(parser)
+    args = parser.parse_args(argv)
+    check_render_arguments(parser, args)
+    
+    sources = batch_sources(args.pattern)
+    if not sources:
+        print(f"Error: No videos found for '{args.pattern}'")
+        sys.exit(1)
+    os.makedirs(args.output_dir, exist_ok=True)
+    # Fix the grid without consulting the terminal, so every file and its up-to-date key use
+    # the same width whether batch runs from a wide terminal, a resized one or cron.
+    settings = render_settings(args, columns=args.max_width or BENCHMARK_GRID[0])
+    
+    outputs = {}
+    for source in sources:
+        output = os.path.join(args.output_dir, os.path.splitext(os.path.basename(source))[0] + ".avpf")
+        outputs.setdefault(output, []).append(source)
+    
+    jobs = {}
+    skipped = clashed = 0
+    for output, clashing in outputs.items():
+        if len(clashing) > 1:
+            # Rendering these would overwrite one another's file and key on every run.
+            clashed += len(clashing)
+            print(f"Failed {', '.join(clashing)}: all would be written to {output}; rename or render them separately.")
+            continue
+        source = clashing[0]
+        key = render_key(source, settings, args.keyframe_interval)
+        if not args.force and is_up_to_date(output, key):
+            skipped += 1
+            continue
+        jobs[source] = (output, key)
+    
+    started = time.perf_counter()
+    total_frames = total_bytes = 0
+    failed = clashed
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(jobs) or 1))) as pool:
+        futures = {
+            pool.submit(batch_render, source, output, settings, key, decoder=args.decoder, compress=args.compress,
+                        keyframe_interval=args.keyframe_interval): source
+            for source, (output, key) in jobs.items()
+        }
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                source = futures[future]
+                try:
+                    frames, size, seconds = future.result()
+                except (ResolveError, OSError, ValueError) as e:
+                    failed += 1
+                    print(f"Failed {source}: {e}")
+                    continue
+                total_frames += frames
+                total_bytes += size
+                print(f"Rendered {source}: {frames} frames, {size} bytes in {seconds:.1f}s")
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("Exiting...")
+            sys.exit(1)
+    elapsed = time.perf_counter() - started
+    print(f"{len(jobs) + clashed - failed} rendered, {skipped} up to date, {failed} failed.")
+    if elapsed > 0 and total_frames:
+        print(f"Throughput: {total_frames / elapsed:.1f} frames/s, {total_bytes / elapsed / 2 ** 20:.2f} MB/s "
+              f"({total_frames} frames, {total_bytes / 2 ** 20:.1f} MB in {elapsed:.1f}s)")
+    if failed:
+        sys.exit(1)
+
+def add_render_arguments(parser):
+    """Add the options that control how frames are converted and encoded, shared by playback and batch."""
     parser.add_argument("-g", "--gradient", choices=["default", "braille"], default="default",
                         help="Select the ASCII gradient to use. 'default' uses standard ASCII characters, 'braille' uses a braille character gradient.")
     parser.add_argument("-G", "--gamma", type=float, default=0.5,
@@ -136,40 +2763,262 @@ def main():
                         help="Maximum width for the ASCII output (optional).")
     parser.add_argument("--max-height", type=int, default=None,
                         help="Maximum height for the ASCII output (optional).")
+    parser.add_argument("--repaint-threshold", type=float, default=DEFAULT_REPAINT_THRESHOLD,
+                        help="Share of changed cells above which the whole frame is repainted "
+                             f"(default: {DEFAULT_REPAINT_THRESHOLD}).")
+    parser.add_argument("--decoder", choices=["cv2", "ffmpeg"], default="cv2",
+                        help="Decoder backend; 'ffmpeg' scales frames to the cell grid while decoding (default: cv2).")
+    parser.add_argument("--compress", action="store_true",
+                        help="zlib-compress frames in pre-rendered files.")
+    parser.add_argument("--keyframe-interval", type=float, default=DEFAULT_KEYFRAME_INTERVAL,
+                        help="Longest run of delta frames in a pre-rendered file, in seconds "
+                             f"(default: {DEFAULT_KEYFRAME_INTERVAL}).")
+    parser.add_argument("--color-depth", choices=COLOR_DEPTHS, default="24bit",
+                        help="Colour escapes to emit: 24-bit, 256-colour, 16-colour or none (default: 24bit).")
+    parser.add_argument("--dither", choices=DITHER_MODES, default="none",
+                        help="Ordered dithering applied before colour quantization (default: none).")
+    parser.add_argument("--color-bits", type=int, choices=range(1, 9), default=DEFAULT_COLOR_BITS,
+                        metavar="{1..8}",
+                        help=f"Colour precision per channel in bits for 24-bit colour (default: {DEFAULT_COLOR_BITS}).")
+    parser.add_argument("--chroma-subsample", type=parse_chroma, default=(1, 1), metavar="N|NxM",
+                        help="Share one colour between N cells horizontally, or NxM cells, while glyphs keep "
+                             "full resolution (default: 1).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Threads that quantize and encode horizontal bands of each frame concurrently; "
+                             "helps on very wide terminals (default: 1).")
+    parser.add_argument("--scene-cut-threshold", type=float, default=SCENE_CUT_THRESHOLD,
+                        help="Mean luma change (0-255) between frames that counts as a scene cut and forces a "
+                             f"full repaint; 0 disables detection (default: {SCENE_CUT_THRESHOLD:g}).")
+    parser.add_argument("--mode", choices=RENDER_MODES, default="glyph",
+                        help="'glyph' draws one pixel per cell with the gradient; 'halfblock' draws two pixels "
+                             "per cell with upper half blocks, doubling the vertical resolution; 'braille' draws 2x4 dots "
+                             "per cell (default: glyph).")
+
+def check_render_arguments(parser, args):
+    """Reject combinations of render options that cannot work."""
+    if args.mode == "halfblock" and args.color_depth == "none":
+        parser.error("--mode halfblock needs colour; it cannot be combined with --color-depth none")
+    if args.mode == "halfblock" and args.chroma_subsample != (1, 1):
+        parser.error("--chroma-subsample does not apply to --mode halfblock, whose colours are its pixels")
+
+def render_settings(args, columns=None):
+    """
+    Collect the render settings from parsed arguments, see make_render_stages().
+    
+    Args:
+        args: Parsed arguments with the options of add_render_arguments().
+        columns (int): Fixed number of columns instead of following the terminal (optional).
+    """
+    return {
+        "gradient": BRAILLE_ASCII_GRADIENT if args.gradient == "braille" else DEFAULT_ASCII_GRADIENT,
+        "gamma": args.gamma,
+        "mode": args.mode,
+        "dither": args.dither,
+        "chroma": args.chroma_subsample,
+        "color_depth": args.color_depth,
+        "color_bits": args.color_bits,
+        "repaint_threshold": args.repaint_threshold,
+        "max_width": args.max_width,
+        "max_height": args.max_height,
+        "columns": columns,
+        "scene_cut_threshold": args.scene_cut_threshold,
+    }
+
+def main():
+    if sys.argv[1:2] == ["batch"]:
+        return batch_main(sys.argv[2:])
+    parser = argparse.ArgumentParser(
+        description="Video to ASCII Converter: Render videos as colored ASCII art in your terminal."
+    )
+    parser.add_argument("source", nargs="?", help="Video file path, YouTube URL or YouTube playlist URL.")
+    add_render_arguments(parser)
+    parser.add_argument("--queue-depth", type=parse_positive_int, default=DEFAULT_QUEUE_DEPTH,
+                        help=f"Frames buffered between decode, convert and output (default: {DEFAULT_QUEUE_DEPTH}).")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH_DEPTH,
+                        help=f"Playlist items to resolve and open ahead of playback; 0 turns prefetching off "
+                             f"(default: {DEFAULT_PREFETCH_DEPTH}).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always resolve stream URLs with yt-dlp instead of using the cache.")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help=f"Maximum number of resolved streams to cache (default: {DEFAULT_CACHE_SIZE}).")
+    parser.add_argument("--render-to", metavar="FILE",
+                        help="Convert the video into a pre-rendered ASCII frame file instead of playing it.")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="With --render-to, encode keyframe intervals in this many worker processes (default: 1).")
+    parser.add_argument("--play-file", metavar="FILE",
+                        help="Play a pre-rendered ASCII frame file at its recorded frame rate.")
+    parser.add_argument("--start", type=parse_timestamp, default=None,
+                        help="With --play-file, start at this timestamp (seconds, MM:SS or HH:MM:SS).")
+    parser.add_argument("--end", type=parse_timestamp, default=None,
+                        help="With --play-file, stop at this timestamp (seconds, MM:SS or HH:MM:SS).")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Measure conversion speed and memory use on synthetic frames, then exit.")
+    parser.add_argument("--benchmark-seconds", type=float, default=DEFAULT_BENCHMARK_SECONDS,
+                        help=f"Length of the --benchmark run in seconds (default: {DEFAULT_BENCHMARK_SECONDS}).")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Print cache statistics at exit.")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="Render once and stream the frames to every TCP client (telnet, nc) on this port "
+                             "instead of drawing them here.")
+    parser.add_argument("--bind", default="127.0.0.1",
+                        help="Address --serve listens on (default: 127.0.0.1).")
+    parser.add_argument("--max-kbps", type=parse_bandwidth, default=None, metavar="KBPS|auto",
+                        help="Adapt resolution, colour depth and repaint threshold to keep output under this many "
+                             "kilobits per second; 'auto' only reacts to writes blocking (default: off).")
     
     args = parser.parse_args()
+    check_render_arguments(parser, args)
     
+    if args.play_file:
+        out = sys.stdout.buffer
+        clock = PlaybackClock(late_tolerance=0.033)
+        out.write(HIDE_CURSOR)
+        try:
+            play_frame_file(args.play_file, out, clock, start=args.start, end=args.end)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            print("Exiting...")
+        finally:
+            out.write(RESET + SHOW_CURSOR + b'\n')
+            out.flush()
+        print(clock.summary())
+        return
     # Choose gradient based on parameter.
     if args.gradient == "braille":
         gradient = BRAILLE_ASCII_GRADIENT
     else:
         gradient = DEFAULT_ASCII_GRADIENT
+    
+    if args.benchmark:
+        run_benchmark(gradient, gamma=args.gamma, color_depth=args.color_depth, color_bits=args.color_bits,
+                      dither=args.dither, max_width=args.max_width, max_height=args.max_height, seconds=args.benchmark_seconds,
+                      mode=args.mode, chroma=args.chroma_subsample, workers=args.workers)
+        return
+    if args.source is None:
+        parser.error("the following arguments are required: source")
+    if args.prefetch < 0:
+        parser.error("--prefetch cannot be negative")
 
-    video_source = get_video_source(args.source)
+    cache = None if args.no_cache else StreamCache(max_entries=args.cache_size)
+    playlist = None
+    if extract_playlist_id(args.source):
+        if args.render_to:
+            parser.error("--render-to takes a single video, not a playlist")
+        try:
+            playlist = get_playlist_videos(args.source)
+        except ResolveError as e:
+            print("Error extracting playlist with yt-dlp:")
+            print(e)
+            sys.exit(1)
+        if not playlist:
+            print(f"Error: No videos found in playlist '{args.source}'")
+            sys.exit(1)
+    else:
+        video_source = get_video_source(args.source, max_width=args.max_width, max_height=args.max_height,
+                                        cache=cache, mode=args.mode)
+        cap = open_video(video_source, decoder=args.decoder, max_width=args.max_width,
+                         max_height=args.max_height, queue_depth=args.queue_depth, mode=args.mode)
+        if not cap.isOpened():
+            print(f"Error: Unable to open video source '{video_source}'")
+            sys.exit(1)
     
-    cap = cv2.VideoCapture(video_source)
-    if not cap.isOpened():
-        print(f"Error: Unable to open video source '{video_source}'")
-        sys.exit(1)
+    settings = render_settings(args)
+    converter, renderer = make_render_stages(settings, workers=args.workers, prescaled=args.decoder == "ffmpeg")
+    convert = make_convert(converter, renderer)
     
-    # Default playback dimensions are based on video dimensions.
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_delay = 1.0 / fps if fps > 0 else 0.033
+    if args.render_to:
+        metadata = {
+            "source": args.source,
+            "gradient": args.gradient,
+            "gamma": args.gamma,
+            "color_depth": args.color_depth,
+            "color_bits": args.color_bits,
+            "dither": args.dither,
+            "mode": args.mode,
+            "chroma_subsample": list(args.chroma_subsample),
+            "scene_cut_threshold": args.scene_cut_threshold,
+            "version": VERSION,
+        }
+        try:
+            if args.processes > 1:
+                writer = render_to_file_parallel(cap, args.render_to, settings, args.processes, metadata=metadata,
+                                                 compress=args.compress, keyframe_interval=args.keyframe_interval,
+                                                 prescaled=args.decoder == "ffmpeg")
+            else:
+                writer = render_to_file(cap, convert, renderer, args.render_to, metadata=metadata,
+                                        compress=args.compress, keyframe_interval=args.keyframe_interval,
+                                        scene_cuts=converter.scene_cuts)
+        except KeyboardInterrupt:
+            print("Exiting...")
+            sys.exit(1)
+        finally:
+            cap.release()
+        print(f"Rendered {len(writer.index)} frames ({writer.bytes_written} bytes) to '{args.render_to}'.")
+        if writer.cut_times():
+            print(format_cuts(writer.cut_times()))
+        return
     
+    bandwidth = None
+    if args.max_kbps is not None:
+        bandwidth = BandwidthController(converter, renderer, max_kbps=args.max_kbps or None,
+                                        color_depth=args.color_depth, color_bits=args.color_bits)
+    clock = PlaybackClock(late_tolerance=0.033)
+    skipped = []
+    if args.serve is not None:
+        try:
+            out = FrameBroadcaster(args.bind, args.serve, request_keyframe=renderer.request_repaint)
+        except OSError as e:
+            print(f"Error: Unable to listen on {args.bind}:{args.serve}: {e}")
+            sys.exit(1)
+        print(f"Serving on {out.address[0]}:{out.address[1]}; connect with 'nc {out.address[0]} {out.address[1]}'.")
+    else:
+        out = sys.stdout.buffer
+        terminal.watch()
+        out.write(HIDE_CURSOR)
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            ascii_frame = frame_to_ascii_color(frame, gamma=args.gamma, gradient=gradient,
-                                               max_width=args.max_width, max_height=args.max_height)
-            clear_screen()
-            print(ascii_frame)
-            time.sleep(frame_delay)
+        if playlist is None:
+            try:
+                play_capture(cap, convert, out, clock, queue_depth=args.queue_depth, bandwidth=bandwidth,
+                             scene_cuts=converter.scene_cuts)
+            finally:
+                cap.release()
+        else:
+            def open_item(source):
+                return open_capture(source, max_width=args.max_width, max_height=args.max_height, cache=cache,
+                                    decoder=args.decoder, queue_depth=args.queue_depth, mode=args.mode)
+            
+            prefetcher = PlaylistPrefetcher(playlist, open_item, depth=args.prefetch)
+            try:
+                for source, item_cap, error in prefetcher:
+                    if item_cap is None:
+                        skipped.append(f"{source}: {error}")
+                        continue
+                    try:
+                        play_capture(item_cap, convert, out, clock, queue_depth=args.queue_depth,
+                                     bandwidth=bandwidth, scene_cuts=converter.scene_cuts)
+                    finally:
+                        item_cap.release()
+            finally:
+                prefetcher.close()
     except KeyboardInterrupt:
         print("Exiting...")
     finally:
-        cap.release()
+        out.write(RESET + SHOW_CURSOR + b'\n')
+        out.flush()
+        if args.serve is not None:
+            out.close()
+            print(out.summary())
+        for message in skipped:
+            print(f"Skipped {message}")
+        print(clock.summary())
+        if bandwidth is not None:
+            print(bandwidth.summary())
+        if args.verbose and converter.scene_cuts is not None and converter.scene_cuts.times:
+            print(format_cuts(converter.scene_cuts.times))
+        if args.verbose and cache is not None:
+            print(cache.summary())
 
 if __name__ == '__main__':
     main()